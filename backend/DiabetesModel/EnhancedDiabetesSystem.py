@@ -1,28 +1,124 @@
-import pandas as pd
-import joblib
+# Only numpy is imported eagerly. joblib/xgboost (and the sklearn wrapper a
+# pickle needs) cost ~2 s to import and are loaded the first time the booster
+# is actually needed; see benchmarks.py import-time for the enforced budget.
 import numpy as np
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.preprocessing import StandardScaler
 import warnings
 import json
 from datetime import datetime
 import sys
 warnings.filterwarnings('ignore')
 
+try:
+    from .clinical_rules import RuleBatch
+    from .feature_schema import EncodingIssues, FeatureSchema
+    from .metrics import StageMetrics
+    from .model_artifacts import is_native_artifact, load_model, read_manifest
+    from .packed_records import pack_results, unpack_records
+    from .response_fragments import FragmentEncoder
+    from .result_cache import ResultCache
+    from .risk_table import RiskLookupTable
+    from .tree_evaluator import TreeEnsemble
+except ImportError:
+    from clinical_rules import RuleBatch
+    from feature_schema import EncodingIssues, FeatureSchema
+    from metrics import StageMetrics
+    from model_artifacts import is_native_artifact, load_model, read_manifest
+    from packed_records import pack_results, unpack_records
+    from response_fragments import FragmentEncoder
+    from result_cache import ResultCache
+    from risk_table import RiskLookupTable
+    from tree_evaluator import TreeEnsemble
+
 class DiabetesRiskAssessmentSystem:
     """
     Enhanced Diabetes Risk Assessment System with Risk Stratification,
     Personalized Recommendations, and Model Interpretability
     """
     
-    def __init__(self, model_path="diabetes_xgb_model.pkl"):
-        """Initialize the diabetes risk assessment system"""
-        self.model = joblib.load(model_path)
+    # Ordered from lowest to highest; index matches _determine_risk_codes
+    RISK_LEVELS = ('low', 'moderate', 'high', 'critical')
+    
+    # Sections of an assessment result, in output order (input_issues only
+    # appears for incomplete or unexpected input); callers may request a subset via fields=
+    RESULT_FIELDS = ('risk_level', 'diabetes_probability', 'confidence', 'prediction', 'feature_importance',
+                     'recommendations', 'educational_content', 'timestamp', 'assessment_summary', 'input_issues')
+    
+    # Stages timed by enable_stage_metrics(): (stage, method of the system or
+    # 'schema.' + method of its FeatureSchema). Batch calls are observed per
+    # call under the same stages.
+    INSTRUMENTED_STAGES = (
+        ('predict_risk_with_confidence', 'predict_risk_with_confidence'),
+        ('predict_risk_with_llm_ensemble', 'predict_risk_with_llm_ensemble'),
+        ('feature_prep', 'schema.encode'),
+        ('feature_prep', '_prepare_batch'),
+        ('predict_proba', '_predict_probabilities'),
+        ('shap_contributions', 'predict_contributions'),
+        ('feature_importance', '_get_feature_importance'),
+        ('recommendations', '_generate_recommendations'),
+        ('educational_content', '_prepare_educational_content'),
+        ('assessment_summary', '_generate_assessment_summary'),
+        ('symptom_summary', '_create_symptom_summary'),
+        ('clinical_context', '_create_clinical_context'),
+        ('serialization', 'to_json'),
+    )
+    
+    # Largest batch scored with the NumPy tree export; it walks every tree in
+    # lock step, which beats the booster's per-call overhead for a few rows
+    # but falls behind from ~32 rows (benchmarks.py tree-evaluator)
+    TREE_EVALUATOR_MAX_ROWS = 32
+    
+    def __init__(self, model_path="diabetes_xgb_model.pkl", risk_table_path=None, cache_size=0, cache_ttl=None,
+                 tree_export_path=None):
+        """Initialize the diabetes risk assessment system
+        
+        Args:
+            model_path: Trained XGBoost model, either a native .ubj/.json artifact
+                with its manifest (see model_artifacts.py) or a legacy joblib pickle
+            risk_table_path: Optional precomputed risk table (see risk_table.py).
+                Probabilities are looked up there for in-range inputs; a table
+                built from a different model is ignored.
+            cache_size: Maximum number of memoized feature vectors (0 disables the cache)
+            cache_ttl: Optional lifetime of a cached entry in seconds
+            tree_export_path: Optional NumPy tree export (see tree_evaluator.py)
+                used instead of the booster to compute probabilities for
+                batches of up to TREE_EVALUATOR_MAX_ROWS rows. With an export
+                the model itself is only loaded for larger batches or when SHAP
+                contributions are requested.
+        """
+        self.model_path = model_path
+        self._model = None
+        
+        self.tree_ensemble = None
+        if tree_export_path:
+            try:
+                self.tree_ensemble = TreeEnsemble.load(tree_export_path, model_path)
+            except (OSError, ValueError) as e:
+                print(f"Tree export disabled, scoring with the booster: {str(e)}", file=sys.stderr)
+        
+        # The hash-checked export records the model's column order, so the
+        # model itself does not have to be unpickled to build the schema
+        if self.tree_ensemble is not None:
+            self.schema = FeatureSchema(self.tree_ensemble.feature_names)
+        else:
+            self.schema = FeatureSchema.for_model(self.model)
+        
+        self.risk_table = None
+        if risk_table_path:
+            try:
+                self.risk_table = RiskLookupTable.load(risk_table_path, model_path, self.schema.feature_names)
+            except (OSError, ValueError) as e:
+                print(f"Risk table disabled, scoring with the model: {str(e)}", file=sys.stderr)
+        
+        self.result_cache = ResultCache(cache_size, cache_ttl) if cache_size else None
+        
         self.risk_thresholds = {
             'low': 0.3,
             'moderate': 0.7,
             'high': 0.9
         }
+        if is_native_artifact(model_path):
+            # Converted models carry the thresholds they were validated with
+            self.risk_thresholds.update(read_manifest(model_path).get('risk_thresholds', {}))
         
         # Symptom explanations for educational purposes
         self.symptom_explanations = {
@@ -98,53 +194,77 @@ class DiabetesRiskAssessmentSystem:
                 }
             }
         }
+        
+        # Recommendations and educational content only depend on the risk level
+        # and the symptoms named; each distinct section is built, frozen and
+        # JSON-encoded once and then shared by every result (see to_json)
+        self.fragments = FragmentEncoder()
+        
+        # Per-stage latency histograms; None until enable_stage_metrics()
+        self.stage_metrics = None
     
-    def predict_risk_with_confidence(self, symptoms_data):
+    def enable_stage_metrics(self, stage_metrics=None):
+        """
+        Time every stage in INSTRUMENTED_STAGES from now on
+        
+        The stage methods are replaced on this instance by timed wrappers, so
+        a system that never calls this runs exactly the untimed code.
+        
+        Args:
+            stage_metrics: StageMetrics to record into (default: a new one)
+            
+        Returns:
+            The StageMetrics in use; calling again returns the same one
+        """
+        if self.stage_metrics is not None:
+            return self.stage_metrics
+        self.stage_metrics = stage_metrics or StageMetrics()
+        for stage, method in self.INSTRUMENTED_STAGES:
+            owner = self
+            if method.startswith('schema.'):
+                owner, method = self.schema, method[len('schema.'):]
+            setattr(owner, method, self.stage_metrics.timed(stage, getattr(owner, method)))
+        return self.stage_metrics
+    
+    @property
+    def model(self):
+        """The trained XGBoost model, loaded on first use"""
+        if self._model is None:
+            self._model = load_model(self.model_path)
+        return self._model
+    
+    def predict_risk_with_confidence(self, symptoms_data, include_importance=True, fields=None):
         """
         Predict diabetes risk with confidence scores and uncertainty measures
         
         Args:
             symptoms_data: Dictionary of symptoms and their values
+            include_importance: Compute per-feature SHAP contributions; when False
+                feature_importance is returned empty and the booster is not asked
+                for contributions
+            fields: Optional subset of RESULT_FIELDS (list or comma-separated
+                string). Sections not listed are neither computed nor returned;
+                None returns the full result
             
         Returns:
             Dictionary with risk prediction, confidence, and explanations
+            
+        Raises:
+            ValueError: If fields names an unknown section
         """
+        fields = self._resolve_fields(fields)
         try:
             # Convert symptoms to model input format
-            feature_vector = self._prepare_features(symptoms_data)
-            
-            # Get prediction probabilities
-            probabilities = self.model.predict_proba(feature_vector)[0]
-            diabetes_probability = probabilities[1]  # Probability of diabetes
-            
-            # Determine risk level
-            risk_level = self._determine_risk_level(diabetes_probability)
-            
-            # Calculate confidence based on probability distribution
-            confidence = self._calculate_confidence(probabilities)
-            
-            # Get feature importance for interpretability
-            feature_importance = self._get_feature_importance(feature_vector)
-            
-            # Generate personalized recommendations
-            recommendations = self._generate_recommendations(risk_level, symptoms_data, feature_importance)
-            
-            # Prepare educational content
-            educational_content = self._prepare_educational_content(symptoms_data)
+            feature_vector, input_issues = self.schema.encode(symptoms_data)
             
-            result = {
-                'risk_level': risk_level,
-                'diabetes_probability': float(round(diabetes_probability, 3)),
-                'confidence': float(round(confidence, 3)),
-                'prediction': 'High Risk' if diabetes_probability > 0.5 else 'Low Risk',
-                'feature_importance': feature_importance,
-                'recommendations': recommendations,
-                'educational_content': educational_content,
-                'timestamp': datetime.now().isoformat(),
-                'assessment_summary': self._generate_assessment_summary(risk_level, diabetes_probability, confidence)
-            }
+            # Probability, risk level, confidence and contributions (memoized when the cache is on)
+            diabetes_probabilities, risk_codes, confidences, contributions = self._score_matrix(
+                feature_vector, self._needs_contributions(include_importance, fields)
+            )
             
-            return result
+            return self._assemble_result(symptoms_data, feature_vector, diabetes_probabilities[0],
+                                         self.RISK_LEVELS[risk_codes[0]], confidences[0], input_issues,
+                                         contributions[0] if contributions is not None else None, fields)
             
         except Exception as e:
             return {
@@ -154,34 +274,339 @@ class DiabetesRiskAssessmentSystem:
                 'confidence': 0.0
             }
     
-    def _prepare_features(self, symptoms_data):
-        """Convert symptoms data to model input format"""
-        # Expected features from training
-        expected_features = [
-            'Age', 'Gender', 'Polyuria', 'Polydipsia', 'sudden weight loss', 
-            'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring', 
-            'Itching', 'Irritability', 'delayed healing', 'partial paresis', 
-            'muscle stiffness', 'Alopecia', 'Obesity'
-        ]
-        
-        feature_vector = []
-        for feature in expected_features:
-            if feature in symptoms_data:
-                value = symptoms_data[feature]
-                # Convert to numeric if needed
-                if isinstance(value, str):
-                    if value.lower() in ['yes', 'true', '1']:
-                        feature_vector.append(1)
-                    elif value.lower() in ['no', 'false', '0']:
-                        feature_vector.append(0)
-                    else:
-                        feature_vector.append(0)  # Default to 0 for unknown
-                else:
-                    feature_vector.append(float(value))
+    def predict_risk_batch(self, batch, include_importance=True, fields=None):
+        """
+        Predict diabetes risk for many patients with a single model call
+        
+        Args:
+            batch: List of symptom dictionaries, a 2-D array whose columns follow
+                self.schema.feature_names, or a DataFrame with named feature columns
+            include_importance: Compute SHAP contributions for the whole batch in
+                one extra booster call; when False feature_importance is empty
+            fields: Optional subset of RESULT_FIELDS, as in predict_risk_with_confidence
+            
+        Returns:
+            List of result dictionaries in input order, each matching the output
+            of predict_risk_with_confidence for the same row
+        """
+        fields = self._resolve_fields(fields)
+        symptoms_rows, feature_matrix, row_issues, row_errors = self._prepare_batch(batch)
+        results = [None] * len(symptoms_rows)
+        
+        for row, message in row_errors.items():
+            results[row] = {
+                'error': f"Assessment failed: {message}",
+                'risk_level': 'unknown',
+                'diabetes_probability': 0.0,
+                'confidence': 0.0
+            }
+        
+        valid_rows = np.array([i for i in range(len(symptoms_rows)) if i not in row_errors], dtype=np.intp)
+        if len(valid_rows) == 0:
+            return results
+        
+        try:
+            feature_matrix = feature_matrix[valid_rows]
+            diabetes_probabilities, risk_codes, confidences, contributions = self._score_matrix(
+                feature_matrix, self._needs_contributions(include_importance, fields)
+            )
+        except Exception as e:
+            for row in valid_rows:
+                results[row] = {
+                    'error': f"Assessment failed: {str(e)}",
+                    'risk_level': 'unknown',
+                    'diabetes_probability': 0.0,
+                    'confidence': 0.0
+                }
+            return results
+        
+        for i, row in enumerate(valid_rows):
+            results[row] = self._assemble_result(
+                symptoms_rows[row],
+                feature_matrix[i:i + 1],
+                diabetes_probabilities[i],
+                self.RISK_LEVELS[risk_codes[i]],
+                confidences[i],
+                row_issues[row],
+                contributions[i] if contributions is not None else None,
+                fields
+            )
+        
+        return results
+    
+    def predict_risk_packed(self, records):
+        """
+        Score a batch of packed records (see packed_records.py) without
+        building result dictionaries
+        
+        Args:
+            records: bytes-like holding whole packed input records
+            
+        Returns:
+            bytes of packed results, one per input record in input order
+            
+        Raises:
+            ValueError: If records is not a whole number of packed records
+        """
+        feature_matrix, complete = unpack_records(records, self.schema)
+        if not len(feature_matrix):
+            return b''
+        diabetes_probabilities, risk_codes, confidences, _ = self._score_matrix(feature_matrix, include_importance=False)
+        return pack_results(diabetes_probabilities, risk_codes, confidences, complete)
+    
+    def predict_what_if(self, symptoms_data, age_offsets=(-10, 10), toggles=None):
+        """
+        How the risk would change under single-feature variations of one patient
+        
+        The patient, each symptom flipped (present -> resolved, absent ->
+        developed) and each age offset are encoded as rows of one matrix and
+        scored in a single model call.
+        
+        Args:
+            symptoms_data: Dictionary of symptoms and their values
+            age_offsets: Years added to the patient's age, one variant each
+                (ages are kept at 0 or above)
+            toggles: Symptoms to flip (default: every symptom the model uses)
+            
+        Returns:
+            Dictionary with the patient's risk_level and diabetes_probability
+            and 'variants', one per change, ranked by the size of their
+            probability delta (largest first)
+            
+        Raises:
+            ValueError: If toggles names a feature that is not a symptom, or
+                an age offset is not a number
+        """
+        schema = self.schema
+        symptom_names = [name for name in schema.feature_names if name not in ('Age', 'Gender')]
+        if toggles is None:
+            toggles = symptom_names
+        unknown = [name for name in toggles if name not in symptom_names]
+        if unknown:
+            raise ValueError(f"Unknown symptoms to toggle: {', '.join(unknown)}")
+        try:
+            age_offsets = [float(offset) for offset in age_offsets]
+        except (TypeError, ValueError):
+            raise ValueError("age_offsets must be numbers")
+        
+        feature_vector, input_issues = schema.encode(symptoms_data)
+        age_column = schema.index['Age']
+        base_age = float(feature_vector[0, age_column])
+        
+        # Row 0 is the patient; then one row per toggle, then one per age offset
+        toggle_columns = np.array([schema.index[name] for name in toggles], dtype=np.intp)
+        ages = np.maximum(base_age + np.array(age_offsets, dtype=float), 0)
+        n_toggles = len(toggle_columns)
+        matrix = np.repeat(feature_vector, 1 + n_toggles + len(ages), axis=0)
+        toggle_rows = np.arange(1, 1 + n_toggles)
+        matrix[toggle_rows, toggle_columns] = 1 - (matrix[toggle_rows, toggle_columns] > 0)
+        matrix[1 + n_toggles:, age_column] = ages
+        
+        diabetes_probabilities, risk_codes, _, _ = self._score_matrix(matrix, include_importance=False)
+        base_probability = diabetes_probabilities[0]
+        
+        variants = []
+        for row, column in enumerate(toggle_columns, start=1):
+            present = feature_vector[0, column] > 0
+            variants.append({
+                'feature': schema.feature_names[column],
+                'change': 'resolved' if present else 'developed',
+                'from': int(present),
+                'to': int(not present),
+            })
+        for age in ages.tolist():
+            variants.append({'feature': 'Age', 'change': 'age', 'from': base_age, 'to': age})
+        for row, variant in enumerate(variants, start=1):
+            delta = diabetes_probabilities[row] - base_probability
+            variant['diabetes_probability'] = float(round(diabetes_probabilities[row], 3))
+            variant['delta'] = float(round(delta, 3))
+            variant['risk_level'] = self.RISK_LEVELS[risk_codes[row]]
+            variant['_rank'] = abs(float(delta))
+        variants.sort(key=lambda variant: variant.pop('_rank'), reverse=True)
+        
+        result = {
+            'risk_level': self.RISK_LEVELS[risk_codes[0]],
+            'diabetes_probability': float(round(base_probability, 3)),
+            'variants': variants
+        }
+        if input_issues:
+            result['input_issues'] = input_issues.to_dict()
+        return result
+    
+    def _prepare_batch(self, batch):
+        """Convert a batch of patients into (symptom dicts, feature matrix, row issues, row errors)"""
+        schema = self.schema
+        if hasattr(batch, 'columns') and hasattr(batch, 'to_dict'):
+            # DataFrame: numeric frames go straight to the matrix, others are
+            # encoded row by row like dictionaries. Empty (NaN) cells count as
+            # missing fields, the same as an absent dictionary key.
+            records = [
+                {key: value for key, value in record.items() if value == value}
+                for record in batch.to_dict('records')
+            ]
+            if all(dtype.kind in 'biuf' for dtype in batch.dtypes):
+                matrix = np.zeros((len(batch), schema.n_features), dtype=schema.dtype)
+                for j, feature in enumerate(schema.feature_names):
+                    if feature in batch.columns:
+                        matrix[:, j] = np.nan_to_num(batch[feature].to_numpy(dtype=float), nan=0.0)
+                extra = [str(column) for column in batch.columns if column not in schema.index]
+                issues = [
+                    EncodingIssues(missing=[name for name in schema.feature_names if name not in record],
+                                   extra=[name for name in extra if name in record])
+                    for record in records
+                ]
+                return records, matrix, issues, {}
+            batch = records
+        elif isinstance(batch, np.ndarray):
+            matrix = schema.encode_array(batch)
+            issues = [EncodingIssues()] * len(matrix)
+            return schema.to_dicts(matrix), matrix, issues, {}
+        elif not isinstance(batch, (list, tuple)):
+            raise TypeError(f"Unsupported batch type: {type(batch).__name__}")
+        
+        rows = list(batch)
+        matrix, issues, errors = schema.encode_many(rows)
+        return rows, matrix, issues, errors
+    
+    def _resolve_fields(self, fields):
+        """Normalize a fields= selection to a frozenset, or None for the full result"""
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+        fields = frozenset(fields)
+        unknown = fields.difference(self.RESULT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown result fields: {', '.join(sorted(unknown))}; "
+                             f"expected a subset of {', '.join(self.RESULT_FIELDS)}")
+        return fields
+    
+    def _needs_contributions(self, include_importance, fields):
+        """SHAP contributions are only worth a booster call when a section uses them"""
+        if not include_importance:
+            return False
+        # Recommendations are ordered by importance, so they need contributions too
+        return fields is None or 'feature_importance' in fields or 'recommendations' in fields
+    
+    def _assemble_result(self, symptoms_data, feature_vector, diabetes_probability, risk_level, confidence,
+                         input_issues=None, contributions=None, fields=None):
+        """Build the assessment result for one scored patient, computing only the requested fields"""
+        def wanted(name):
+            return fields is None or name in fields
+        
+        # Get feature importance for interpretability (skipped when no contributions were computed)
+        feature_importance = ranked_features = None
+        if wanted('feature_importance') or wanted('recommendations'):
+            if contributions is not None:
+                feature_importance = self._get_feature_importance(feature_vector, contributions)
+                ranked_features = feature_importance
             else:
-                feature_vector.append(0)  # Default value for missing features
+                feature_importance = {}
+                ranked_features = [name for name, value in zip(self.schema.feature_names, feature_vector[0])
+                                   if value > 0]
+        
+        # Each section is only built when requested; dict order follows RESULT_FIELDS
+        sections = {
+            'risk_level': lambda: risk_level,
+            'diabetes_probability': lambda: float(round(diabetes_probability, 3)),
+            'confidence': lambda: float(round(confidence, 3)),
+            'prediction': lambda: 'High Risk' if diabetes_probability > 0.5 else 'Low Risk',
+            'feature_importance': lambda: feature_importance,
+            # Generate personalized recommendations
+            'recommendations': lambda: self._generate_recommendations(risk_level, symptoms_data, ranked_features),
+            # Prepare educational content
+            'educational_content': lambda: self._prepare_educational_content(symptoms_data),
+            'timestamp': lambda: datetime.now().isoformat(),
+            'assessment_summary': lambda: self._generate_assessment_summary(risk_level, diabetes_probability,
+                                                                            confidence)
+        }
+        result = {name: build() for name, build in sections.items() if wanted(name)}
+        
+        # Only present when the input was incomplete, so complete assessments are unchanged
+        if input_issues and wanted('input_issues'):
+            result['input_issues'] = input_issues.to_dict()
+        
+        return result
+    
+    def _score_matrix(self, feature_matrix, include_importance=True):
+        """
+        Model-derived values for encoded rows, served from the result cache when enabled
+        
+        Returns:
+            (diabetes probabilities, risk codes into RISK_LEVELS, confidences,
+            SHAP contributions or None), one entry per row
+        """
+        cache = self.result_cache
+        if cache is None:
+            return self._score_uncached(feature_matrix, include_importance)
+        
+        is_usable = (lambda entry: entry[3] is not None) if include_importance else None
+        keys = self.schema.row_keys(feature_matrix)
+        entries = [cache.get(key, is_usable) for key in keys]
+        
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            scored = self._score_uncached(feature_matrix[missing], include_importance)
+            for j, i in enumerate(missing):
+                entry = (scored[0][j], scored[1][j], scored[2][j],
+                         scored[3][j] if scored[3] is not None else None)
+                cache.put(keys[i], entry)
+                entries[i] = entry
+        
+        diabetes_probabilities = np.array([entry[0] for entry in entries])
+        risk_codes = np.array([entry[1] for entry in entries])
+        confidences = np.array([entry[2] for entry in entries])
+        contributions = np.array([entry[3] for entry in entries]) if include_importance else None
+        return diabetes_probabilities, risk_codes, confidences, contributions
+    
+    def _score_uncached(self, feature_matrix, include_importance=True):
+        """Score encoded rows with the risk table / booster; see _score_matrix"""
+        probabilities = self._predict_probabilities(feature_matrix)
+        diabetes_probabilities = probabilities[:, 1]
+        
+        # Risk levels, confidences and labels for the whole batch at once
+        risk_codes = self._determine_risk_codes(diabetes_probabilities)
+        confidences = np.minimum(2 * np.abs(np.max(probabilities, axis=1) - 0.5), 1.0)
+        
+        contributions = self.predict_contributions(feature_matrix) if include_importance else None
+        return diabetes_probabilities, risk_codes, confidences, contributions
+    
+    def to_json(self, result, depth=1):
+        """
+        Same text as json.dumps(result), with the shared recommendation and
+        educational sections spliced in from their pre-encoded JSON
+        
+        Args:
+            result: Assessment result dictionary
+            depth: Container levels to look through for shared sections; use 2
+                for a message that embeds a result, or a list of results
+        """
+        return self.fragments.dumps(result, depth)
+    
+    def cache_stats(self):
+        """Hit/miss/eviction counters of the result cache, or None when it is disabled"""
+        return self.result_cache.stats() if self.result_cache is not None else None
+    
+    def _model_predict_proba(self, feature_matrix):
+        """predict_proba from the tree export for small batches, from the booster otherwise"""
+        if self.tree_ensemble is not None and len(feature_matrix) <= self.TREE_EVALUATOR_MAX_ROWS:
+            return self.tree_ensemble.predict_proba(feature_matrix)
+        return self.model.predict_proba(feature_matrix)
+    
+    def _predict_probabilities(self, feature_matrix):
+        """predict_proba, answered from the risk table for every row it covers"""
+        if self.risk_table is None:
+            return self._model_predict_proba(feature_matrix)
         
-        return np.array(feature_vector).reshape(1, -1)
+        diabetes_probabilities, covered = self.risk_table.lookup(feature_matrix)
+        if not covered.all():
+            diabetes_probabilities[~covered] = self._model_predict_proba(feature_matrix[~covered])[:, 1]
+        return np.column_stack((1 - diabetes_probabilities, diabetes_probabilities))
+    
+    def _prepare_features(self, symptoms_data):
+        """Convert symptoms data to model input format"""
+        feature_vector, _ = self.schema.encode(symptoms_data)
+        return feature_vector
     
     def _determine_risk_level(self, probability):
         """Determine risk level based on probability"""
@@ -194,6 +619,15 @@ class DiabetesRiskAssessmentSystem:
         else:
             return 'low'
     
+    def _determine_risk_codes(self, probabilities):
+        """Vectorized _determine_risk_level: indexes into RISK_LEVELS"""
+        thresholds = np.array([
+            self.risk_thresholds['low'],
+            self.risk_thresholds['moderate'],
+            self.risk_thresholds['high']
+        ], dtype=probabilities.dtype)
+        return np.searchsorted(thresholds, probabilities, side='right')
+    
     def _calculate_confidence(self, probabilities):
         """Calculate confidence based on probability distribution"""
         # Higher confidence when probabilities are more extreme (closer to 0 or 1)
@@ -201,30 +635,42 @@ class DiabetesRiskAssessmentSystem:
         confidence = 2 * abs(max_prob - 0.5)  # Scale to 0-1 range
         return min(confidence, 1.0)
     
-    def _get_feature_importance(self, feature_vector):
+    def predict_contributions(self, feature_matrix):
+        """
+        Per-feature TreeSHAP contributions from the booster, for a whole batch at once
+        
+        Args:
+            feature_matrix: Encoded features of shape (n, n_features)
+            
+        Returns:
+            Array of shape (n, n_features + 1) in log-odds units. The last column
+            is the bias term, and each row sums to the model's raw margin.
+        """
+        import xgboost as xgb
+        
+        booster = self.model.get_booster()
+        dmatrix = xgb.DMatrix(np.asarray(feature_matrix, dtype=self.schema.dtype),
+                              feature_names=booster.feature_names)
+        return booster.predict(dmatrix, pred_contribs=True)
+    
+    def _get_feature_importance(self, feature_vector, contributions=None):
         """Get feature importance for interpretability"""
         try:
-            # Get feature names
-            feature_names = [
-                'Age', 'Gender', 'Polyuria', 'Polydipsia', 'sudden weight loss', 
-                'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring', 
-                'Itching', 'Irritability', 'delayed healing', 'partial paresis', 
-                'muscle stiffness', 'Alopecia', 'Obesity'
-            ]
-            
-            # Get SHAP-like feature importance (simplified version)
-            # In a real implementation, you'd use actual SHAP values
-            feature_values = feature_vector[0]
+            feature_names = self.schema.feature_names
+            feature_values = feature_vector[0].tolist()
+            if contributions is None:
+                contributions = self.predict_contributions(feature_vector)[0]
+            contributions = contributions.tolist()
             
-            # Create importance scores based on feature values and model weights
+            # SHAP value of each present feature (log-odds); importance is its magnitude
             importance_scores = {}
-            for i, (name, value) in enumerate(zip(feature_names, feature_values)):
+            for name, value, shap_value in zip(feature_names, feature_values, contributions):
                 if value > 0:  # Only show importance for present symptoms
-                    # Simplified importance calculation
                     importance_scores[name] = {
                         'value': value,
-                        'importance': abs(value) * (0.1 + i * 0.05),  # Mock importance
-                        'contribution': 'positive' if value > 0 else 'negative'
+                        'importance': abs(shap_value),
+                        'contribution': 'positive' if shap_value >= 0 else 'negative',
+                        'shap_value': shap_value
                     }
             
             # Sort by importance
@@ -240,7 +686,21 @@ class DiabetesRiskAssessmentSystem:
             return {'error': f"Could not calculate feature importance: {str(e)}"}
     
     def _generate_recommendations(self, risk_level, symptoms_data, feature_importance):
-        """Generate personalized recommendations based on risk level and symptoms"""
+        """Generate personalized recommendations based on risk level and symptoms
+        
+        feature_importance only needs to iterate present feature names, most
+        important first (a feature importance dict or a plain list). The
+        returned section is shared and read-only.
+        """
+        specific = self.recommendations[risk_level]['specific']
+        symptoms = tuple(symptom for symptom in feature_importance if symptom in specific)
+        return self.fragments.section(
+            ('recommendations', risk_level, symptoms),
+            lambda: self._build_recommendations(risk_level, symptoms)
+        )
+    
+    def _build_recommendations(self, risk_level, symptoms):
+        """Recommendations section for a risk level and its matching symptoms, in order"""
         recommendations = {
             'risk_level': risk_level,
             'general_recommendations': self.recommendations[risk_level]['general'],
@@ -250,7 +710,7 @@ class DiabetesRiskAssessmentSystem:
         }
         
         # Add symptom-specific recommendations
-        for symptom, data in feature_importance.items():
+        for symptom in symptoms:
             if symptom in self.recommendations[risk_level]['specific']:
                 recommendations['symptom_specific'].append({
                     'symptom': symptom,
@@ -302,7 +762,15 @@ class DiabetesRiskAssessmentSystem:
         return steps.get(risk_level, ["Consult your healthcare provider"])
     
     def _prepare_educational_content(self, symptoms_data):
-        """Prepare educational content about diabetes and symptoms"""
+        """Prepare educational content about diabetes and symptoms (a shared, read-only section)"""
+        symptoms = tuple(symptom for symptom in symptoms_data if symptom in self.symptom_explanations)
+        return self.fragments.section(
+            ('educational_content', symptoms),
+            lambda: self._build_educational_content(symptoms)
+        )
+    
+    def _build_educational_content(self, symptoms):
+        """Educational content explaining the given symptoms, in order"""
         educational = {
             'about_diabetes': "Diabetes is a chronic condition that affects how your body processes blood sugar (glucose).",
             'symptom_explanations': {},
@@ -317,7 +785,7 @@ class DiabetesRiskAssessmentSystem:
         }
         
         # Add explanations for present symptoms
-        for symptom in symptoms_data:
+        for symptom in symptoms:
             if symptom in self.symptom_explanations:
                 educational['symptom_explanations'][symptom] = self.symptom_explanations[symptom]
         
@@ -367,32 +835,66 @@ class DiabetesRiskAssessmentSystem:
         try:
             # Get base XGBoost prediction
             base_result = self.predict_risk_with_confidence(symptoms_data)
-            
-            # Enhance result with structured data for LLM processing
-            llm_ready_result = {
-                **base_result,
-                'llm_enhancement_ready': True,
-                'symptom_summary': self._create_symptom_summary(symptoms_data),
-                'clinical_context': self._create_clinical_context(symptoms_data, base_result),
-                'enhancement_metadata': {
-                    'model_type': 'XGBoost',
-                    'requires_llm_validation': base_result['confidence'] < 0.8,
-                    'symptom_count': sum(1 for k, v in symptoms_data.items() 
-                                       if k not in ['Age', 'Gender'] and v == 1),
-                    'classic_triad_present': self._check_classic_triad(symptoms_data)
-                }
-            }
-            
-            return llm_ready_result
+            return self._llm_ready_result(symptoms_data, base_result, self._evaluate_rules([symptoms_data], [base_result]), 0)
             
         except Exception as e:
-            return {
-                'error': f"LLM-ready assessment failed: {str(e)}",
-                'risk_level': 'unknown',
-                'diabetes_probability': 0.0,
-                'confidence': 0.0,
-                'llm_enhancement_ready': False
+            return self._llm_error_result(e)
+    
+    def predict_risk_with_llm_ensemble_batch(self, batch):
+        """
+        predict_risk_with_llm_ensemble for many patients: one model call and
+        one vectorized pass of the clinical rules for the whole batch
+        
+        Args:
+            batch: List of symptom dictionaries
+            
+        Returns:
+            List of results in input order, each matching
+            predict_risk_with_llm_ensemble for the same patient
+        """
+        base_results = self.predict_risk_batch(batch)
+        try:
+            rules = self._evaluate_rules(batch, base_results)
+        except Exception:
+            # A row the rules cannot read (e.g. a non-numeric Age) only fails itself
+            return [self.predict_risk_with_llm_ensemble(symptoms_data) for symptoms_data in batch]
+        
+        results = []
+        for row, (symptoms_data, base_result) in enumerate(zip(batch, base_results)):
+            try:
+                results.append(self._llm_ready_result(symptoms_data, base_result, rules, row))
+            except Exception as e:
+                results.append(self._llm_error_result(e))
+        return results
+    
+    def _llm_ready_result(self, symptoms_data, base_result, rules, row):
+        """Enhance one base result with structured data for LLM processing"""
+        return {
+            **base_result,
+            'llm_enhancement_ready': True,
+            'symptom_summary': self._create_symptom_summary(symptoms_data),
+            'clinical_context': self._create_clinical_context(symptoms_data, base_result, rules, row),
+            'enhancement_metadata': {
+                'model_type': 'XGBoost',
+                'requires_llm_validation': base_result['confidence'] < 0.8,
+                'symptom_count': rules.symptom_count(row),
+                'classic_triad_present': rules.classic_triad(row)
             }
+        }
+    
+    def _llm_error_result(self, error):
+        return {
+            'error': f"LLM-ready assessment failed: {str(error)}",
+            'risk_level': 'unknown',
+            'diabetes_probability': 0.0,
+            'confidence': 0.0,
+            'llm_enhancement_ready': False
+        }
+    
+    def _evaluate_rules(self, rows, base_results):
+        """Clinical rules (see clinical_rules.py) for patients and their base results"""
+        return RuleBatch(rows, [result['diabetes_probability'] for result in base_results],
+                         [result['confidence'] for result in base_results])
     
     def _create_symptom_summary(self, symptoms_data):
         """Create a human-readable symptom summary for LLM processing"""
@@ -433,8 +935,16 @@ class DiabetesRiskAssessmentSystem:
             'gender': 'Male' if symptoms_data.get('Gender') == 1 else 'Female' if symptoms_data.get('Gender') == 0 else 'unknown'
         }
     
-    def _create_clinical_context(self, symptoms_data, base_result):
-        """Create clinical context for LLM reasoning"""
+    def _create_clinical_context(self, symptoms_data, base_result, rules=None, row=0):
+        """
+        Create clinical context for LLM reasoning
+        
+        Args:
+            rules: RuleBatch already evaluated for a batch holding this patient
+                at index row; evaluated for this patient alone when omitted
+        """
+        if rules is None:
+            rules, row = self._evaluate_rules([symptoms_data], [base_result]), 0
         context = {
             'patient_profile': {
                 'age': symptoms_data.get('Age', 'unknown'),
@@ -442,104 +952,17 @@ class DiabetesRiskAssessmentSystem:
                 'obesity_status': 'Yes' if symptoms_data.get('Obesity') == 1 else 'No'
             },
             'symptom_patterns': {
-                'classic_triad': self._check_classic_triad(symptoms_data),
-                'metabolic_symptoms': self._check_metabolic_symptoms(symptoms_data),
-                'complication_signs': self._check_complication_signs(symptoms_data)
+                'classic_triad': rules.classic_triad(row),
+                'metabolic_symptoms': rules.metabolic_symptoms(row),
+                'complication_signs': rules.complication_signs(row)
             },
             'risk_indicators': {
-                'high_priority_symptoms': self._identify_high_priority_symptoms(symptoms_data),
-                'red_flags': self._identify_red_flags(symptoms_data, base_result)
+                'high_priority_symptoms': rules.high_priority_symptoms(row),
+                'red_flags': rules.red_flags(row)
             }
         }
         
         return context
-    
-    def _check_classic_triad(self, symptoms_data):
-        """Check for classic diabetes triad: Polyuria, Polydipsia, Polyphagia"""
-        triad = {
-            'polyuria': symptoms_data.get('Polyuria', 0) == 1,
-            'polydipsia': symptoms_data.get('Polydipsia', 0) == 1,
-            'polyphagia': symptoms_data.get('Polyphagia', 0) == 1
-        }
-        triad['present'] = sum(triad.values())
-        triad['complete'] = triad['present'] == 3
-        return triad
-    
-    def _check_metabolic_symptoms(self, symptoms_data):
-        """Check for metabolic symptoms"""
-        return {
-            'weight_loss': symptoms_data.get('sudden weight loss', 0) == 1,
-            'weakness': symptoms_data.get('weakness', 0) == 1,
-            'obesity': symptoms_data.get('Obesity', 0) == 1,
-            'present_count': sum([
-                symptoms_data.get('sudden weight loss', 0) == 1,
-                symptoms_data.get('weakness', 0) == 1,
-                symptoms_data.get('Obesity', 0) == 1
-            ])
-        }
-    
-    def _check_complication_signs(self, symptoms_data):
-        """Check for signs of complications"""
-        return {
-            'vision_problems': symptoms_data.get('visual blurring', 0) == 1,
-            'delayed_healing': symptoms_data.get('delayed healing', 0) == 1,
-            'neuropathy_signs': symptoms_data.get('partial paresis', 0) == 1 or symptoms_data.get('muscle stiffness', 0) == 1,
-            'infections': symptoms_data.get('Genital thrush', 0) == 1 or symptoms_data.get('Itching', 0) == 1,
-            'present_count': sum([
-                symptoms_data.get('visual blurring', 0) == 1,
-                symptoms_data.get('delayed healing', 0) == 1,
-                symptoms_data.get('partial paresis', 0) == 1,
-                symptoms_data.get('muscle stiffness', 0) == 1,
-                symptoms_data.get('Genital thrush', 0) == 1,
-                symptoms_data.get('Itching', 0) == 1
-            ])
-        }
-    
-    def _identify_high_priority_symptoms(self, symptoms_data):
-        """Identify high-priority symptoms that warrant immediate attention"""
-        high_priority = []
-        
-        priority_symptoms = {
-            'Polyuria': 'Classic diabetes symptom - requires evaluation',
-            'Polydipsia': 'Classic diabetes symptom - requires evaluation',
-            'sudden weight loss': 'Concerning symptom - may indicate uncontrolled diabetes',
-            'visual blurring': 'Potential diabetes complication - needs ophthalmologic evaluation',
-            'delayed healing': 'Sign of poor glycemic control or complications'
-        }
-        
-        for symptom, explanation in priority_symptoms.items():
-            if symptoms_data.get(symptom, 0) == 1:
-                high_priority.append({
-                    'symptom': symptom,
-                    'reason': explanation
-                })
-        
-        return high_priority
-    
-    def _identify_red_flags(self, symptoms_data, base_result):
-        """Identify red flags requiring immediate medical attention"""
-        red_flags = []
-        
-        # Check for severe symptom combinations
-        if (symptoms_data.get('Polyuria', 0) == 1 and 
-            symptoms_data.get('Polydipsia', 0) == 1 and 
-            symptoms_data.get('sudden weight loss', 0) == 1):
-            red_flags.append('Complete classic triad present - suggests significant hyperglycemia')
-        
-        if base_result['diabetes_probability'] > 0.8 and base_result['confidence'] > 0.7:
-            red_flags.append('Very high probability with good confidence - immediate evaluation recommended')
-        
-        if symptoms_data.get('visual blurring', 0) == 1 and base_result['diabetes_probability'] > 0.6:
-            red_flags.append('Vision changes with elevated diabetes risk - urgent ophthalmologic evaluation needed')
-        
-        # Check age and multiple symptoms
-        age = symptoms_data.get('Age', 0)
-        symptom_count = sum(1 for k, v in symptoms_data.items() 
-                          if k not in ['Age', 'Gender'] and v == 1)
-        if age > 40 and symptom_count >= 6:
-            red_flags.append('Multiple symptoms in middle-aged/older patient - comprehensive evaluation warranted')
-        
-        return red_flags
 
 # Example usage and testing
 def test_enhanced_system():
@@ -9,48 +9,436 @@ Original : https://huggingface.co/WaltonFuture/Diabetica-7B
 
 import json
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
 import gradio as gr
 from huggingface_hub import hf_hub_download
-from llama_cpp import Llama
+from llama_cpp import Llama, StoppingCriteriaList
 
 # ---------------------------------------------------------------------------
-# Model download (cached on Space persistent storage between restarts)
+# Model configuration
+# By default the GGUF is downloaded from the Hub (cached on Space persistent
+# storage between restarts). DIABETICA_MODEL_PATH loads a local file instead,
+# and DIABETICA_OFFLINE=true only uses the Hub cache; neither touches the
+# network.
+# n_ctx = context window (tokens)
+# n_threads = vCPUs available on CPU Basic, split between the contexts
+# n_ctx, n_threads, n_threads_batch and n_batch come from the tuning file
+# written by `python benchmarks.py llm-tune` when present; environment
+# variables override it.
+# With use_mmap every context maps the same GGUF file, so the weights are held
+# once and each extra context only adds its own KV cache (~230 MB at
+# n_ctx=4096); use_mlock additionally pins those pages so they are never
+# swapped out.
 # ---------------------------------------------------------------------------
 MODEL_REPO = "mradermacher/Diabetica-7B-GGUF"
 MODEL_FILE = "Diabetica-7B.Q8_0.gguf"  # 8.1 GB — near-full quality (99%), fits in 16 GB RAM
 CACHE_DIR = Path("/tmp/models")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-print(f"Downloading {MODEL_FILE} from {MODEL_REPO} (first run: ~5 min) ...")
-model_path = hf_hub_download(
-    repo_id=MODEL_REPO,
-    filename=MODEL_FILE,
-    cache_dir=str(CACHE_DIR),
-)
-print(f"Model cached at: {model_path}")
+LOCAL_MODEL_PATH = os.getenv("DIABETICA_MODEL_PATH", "")
+OFFLINE = os.getenv("DIABETICA_OFFLINE", "false").lower() == "true"
+USE_MMAP = os.getenv("DIABETICA_USE_MMAP", "true").lower() == "true"
+USE_MLOCK = os.getenv("DIABETICA_USE_MLOCK", "false").lower() == "true"
+TUNING_FILE = Path(os.getenv("DIABETICA_TUNING_FILE", str(Path(__file__).with_name("llm_tuning.json"))))
+
+
+def _load_tuning(path: Path) -> dict:
+    """Best llama-cpp settings measured on this host ({} when there is no usable tuning file)"""
+    try:
+        best = json.loads(path.read_text())["best"]
+    except FileNotFoundError:
+        return {}
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring tuning file {path}: {e}")
+        return {}
+    print(f"Using tuned llama-cpp settings from {path}: {best}")
+    return best
+
+
+TUNING = _load_tuning(TUNING_FILE)
+
+
+def _setting(env_name: str, key: str, default: int) -> int:
+    return int(os.getenv(env_name) or TUNING.get(key, default))
+
+
+N_CONTEXTS = max(1, int(os.getenv("DIABETICA_CONTEXTS", "1")))
+N_CTX = _setting("DIABETICA_CTX", "n_ctx", 4096)
+N_THREADS = _setting("DIABETICA_THREADS", "n_threads", 2)                  # CPU Basic gives 2 vCPUs
+N_THREADS_BATCH = _setting("DIABETICA_THREADS_BATCH", "n_threads_batch", N_THREADS)  # threads for prompt prefill
+N_BATCH = _setting("DIABETICA_BATCH", "n_batch", 512)                      # prompt tokens processed at once
+WARMUP = os.getenv("DIABETICA_WARMUP", "true").lower() == "true"
+
 
 # ---------------------------------------------------------------------------
-# Load model into llama-cpp (stays in RAM for the lifetime of the Space)
-# n_ctx = context window (tokens)
-# n_threads = vCPUs available on CPU Basic
+# Prompt-prefix state cache
+# Every request starts with the same system turn, and most user messages with
+# the same instruction header. The llama-cpp state (KV cache) right after
+# each such prefix is snapshotted once and restored on later requests, so
+# only the rest of the prompt is prefilled.
 # ---------------------------------------------------------------------------
-print("Loading model into llama-cpp (this takes ~60 s on first load)...")
-llm = Llama(
-    model_path=model_path,
-    n_ctx=4096,
-    n_threads=2,    # CPU Basic gives 2 vCPUs
-    n_batch=512,    # process 512 tokens at once for better throughput
-    n_gpu_layers=0, # CPU only
-    verbose=False,
+PREFIX_CACHE_ENTRIES = int(os.getenv("DIABETICA_PREFIX_CACHE_ENTRIES", "16"))  # 0 disables the cache
+PREFIX_CACHE_MB = int(os.getenv("DIABETICA_PREFIX_CACHE_MB", "512"))
+
+# Fixed openings of user messages; keep in sync with the prompts built in
+# backend/services/hybridRiskService.js
+INSTRUCTION_HEADERS = (
+    "# Diabetes Risk Assessment Validation\n\n## Patient Profile\n",
 )
-print("Diabetica-7B ready.")
+
+
+class PrefixStateCache:
+    """LRU of llama-cpp states keyed by the prompt-prefix tokens they hold, bounded by count and bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # prefix tokens -> (state, seconds to prefill it from scratch)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefill_seconds_saved = 0.0
+        # Shared by every context; held for lookups and updates, not while prefilling
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, state, prefill_seconds: float) -> None:
+        size = state.llama_state_size
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[0].llama_state_size
+        self.entries[key] = (state, prefill_seconds)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted.llama_state_size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "megabytes": round(self.bytes / 2**20, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "prefill_seconds_saved": round(self.prefill_seconds_saved, 2),
+        }
+
+
+prefix_cache = PrefixStateCache(PREFIX_CACHE_ENTRIES, PREFIX_CACHE_MB * 2**20)
+
+
+def _tokenize(llm: Llama, text: str, add_bos: bool = False) -> list:
+    return llm.tokenize(text.encode("utf-8"), add_bos=add_bos, special=True)
+
+
+def _restore_prefix(llm: Llama, segments: list) -> tuple:
+    """Leave llm holding the KV state of all segments (token lists), restoring the longest cached prefix
+
+    Each concatenation segments[0] + ... + segments[i] is a cacheable prefix;
+    the ones not cached yet are prefilled and snapshotted.
+
+    Returns:
+        (prefix tokens, how many of them were restored, seconds of prefill the restored snapshot saved)
+    """
+    keys = []
+    tokens = []
+    for segment in segments:
+        tokens = tokens + segment
+        keys.append(tuple(tokens))
+
+    start, saved, elapsed = 0, 0.0, 0.0
+    for level in reversed(range(len(keys))):
+        with prefix_cache.lock:
+            entry = prefix_cache.get(keys[level])
+        if entry is not None:
+            state, saved = entry
+            llm.load_state(state)
+            start, elapsed = level + 1, saved
+            break
+    else:
+        llm.reset()
+
+    for level in range(start, len(keys)):
+        started = time.perf_counter()
+        llm.eval(segments[level])
+        elapsed += time.perf_counter() - started
+        state = llm.save_state()
+        with prefix_cache.lock:
+            prefix_cache.put(keys[level], state, elapsed)
+
+    with prefix_cache.lock:
+        if saved:
+            prefix_cache.hits += 1
+            prefix_cache.prefill_seconds_saved += saved
+        else:
+            prefix_cache.misses += 1
+    return tokens, len(keys[start - 1]) if start else 0, saved
 
 
 # ---------------------------------------------------------------------------
-# Inference function — exposed as the Gradio API endpoint /api/predict
+# Request scheduling
+# Each request waits for a free context in a bounded queue. A request that
+# finds the queue full, or cannot start before its deadline, is rejected at
+# once; one that reaches its deadline while generating stops there. Under a
+# burst, callers get a fast "busy" error instead of timing out.
 # ---------------------------------------------------------------------------
+MAX_QUEUE_DEPTH = int(os.getenv("DIABETICA_MAX_QUEUE", "4"))                    # requests waiting for a context
+DEADLINE_SECONDS = float(os.getenv("DIABETICA_DEADLINE_SECONDS", "180"))        # from arrival; 0 = none
+WAIT_SAMPLES = 1000                                                             # recent waits kept for stats
+
+
+class ContextScheduler:
+    """Hands llama contexts out to requests, with admission control, deadlines and queue metrics"""
+
+    def __init__(self, contexts: list, max_queue_depth: int, deadline_seconds: float):
+        self.idle = queue.SimpleQueue()
+        for llm in contexts:
+            self.idle.put(llm)
+        self.n_contexts = len(contexts)
+        self.max_queue_depth = max_queue_depth
+        self.deadline_seconds = deadline_seconds
+        self.lock = threading.Lock()
+        self.pending = 0  # waiting + running
+        self.peak_queue_depth = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.expired_in_queue = 0
+        self.stopped_at_deadline = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    @contextmanager
+    def slot(self, arrived=None):
+        """Hold a free context for one request: yields (llm, deadline on the time.monotonic() clock or None)
+
+        Args:
+            arrived : time.monotonic() when the request was accepted (default: now); the deadline
+                      and the recorded wait count from it
+
+        Raises:
+            gr.Error: If the queue is full or no context frees up before the deadline
+        """
+        if arrived is None:
+            arrived = time.monotonic()
+        deadline = arrived + self.deadline_seconds if self.deadline_seconds > 0 else None
+        with self.lock:
+            if self.pending >= self.n_contexts + self.max_queue_depth:
+                self.rejected_full += 1
+                raise gr.Error(f"Diabetica is busy ({self.pending - self.n_contexts} requests queued); retry later")
+            self.pending += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.pending - self.n_contexts)
+
+        try:
+            try:
+                llm = self.idle.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                with self.lock:
+                    self.expired_in_queue += 1
+                raise gr.Error(f"Diabetica could not start this request within {self.deadline_seconds:.0f} s; "
+                               f"retry later")
+            with self.lock:
+                self.admitted += 1
+                self.waits.append(time.monotonic() - arrived)
+            try:
+                yield llm, deadline
+            finally:
+                self.idle.put(llm)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def stopping_criteria(self, deadline):
+        """llama-cpp stopping criteria ending generation at the deadline (None when there is none)"""
+        if deadline is None:
+            return None
+
+        stopped = False
+
+        def past_deadline(input_ids, logits) -> bool:
+            nonlocal stopped
+            if time.monotonic() < deadline:
+                return False
+            # llama-cpp checks the criteria again once generation ends; count the stop once
+            if not stopped:
+                stopped = True
+                with self.lock:
+                    self.stopped_at_deadline += 1
+                print("Generation stopped at its deadline")
+            return True
+
+        return StoppingCriteriaList([past_deadline])
+
+    def stats(self) -> dict:
+        with self.lock:
+            waits = sorted(self.waits)
+            running = min(self.pending, self.n_contexts)
+            stats = {
+                "contexts": self.n_contexts,
+                "running": running,
+                "queue_depth": self.pending - running,
+                "peak_queue_depth": self.peak_queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "deadline_seconds": self.deadline_seconds,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_full,
+                "expired_in_queue": self.expired_in_queue,
+                "stopped_at_deadline": self.stopped_at_deadline,
+            }
+        if waits:
+            stats["wait_seconds"] = {
+                "mean": round(sum(waits) / len(waits), 2),
+                "p50": round(waits[len(waits) // 2], 2),
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2),
+                "max": round(waits[-1], 2),
+            }
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Startup
+# The model is loaded and warmed up in a background thread while the UI is
+# already serving, so health checks see "loading" -> "warming" -> "ready"
+# (or "error") with per-phase timings instead of connection failures.
+# ---------------------------------------------------------------------------
+PROCESS_STARTED = time.monotonic()
+server_state = {"status": "loading", "error": None, "timings": {}}
+contexts = []
+scheduler = None
+
+
+def _resolve_model_path() -> str:
+    if LOCAL_MODEL_PATH:
+        if not os.path.isfile(LOCAL_MODEL_PATH):
+            raise FileNotFoundError(f"DIABETICA_MODEL_PATH does not exist: {LOCAL_MODEL_PATH}")
+        print(f"Using local model {LOCAL_MODEL_PATH}")
+        return LOCAL_MODEL_PATH
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    if OFFLINE:
+        print(f"Using cached {MODEL_FILE} (offline)")
+    else:
+        print(f"Downloading {MODEL_FILE} from {MODEL_REPO} (first run: ~5 min) ...")
+    path = hf_hub_download(
+        repo_id=MODEL_REPO,
+        filename=MODEL_FILE,
+        cache_dir=str(CACHE_DIR),
+        local_files_only=OFFLINE,
+    )
+    print(f"Model cached at: {path}")
+    return path
+
+
+def _warmup(llm: Llama) -> None:
+    """Short generation so the weights are paged in and the compute buffers allocated before serving"""
+    llm("<|im_start|>user\nHello<|im_end|>\n<|im_start|>assistant\n", max_tokens=4, temperature=0.0)
+    llm.reset()
+
+
+def load_model() -> None:
+    """Resolve, load and warm up the model, recording each phase in server_state"""
+    global scheduler
+    timings = server_state["timings"]
+    try:
+        started = time.monotonic()
+        path = _resolve_model_path()
+        timings["resolve_seconds"] = round(time.monotonic() - started, 2)
+
+        print(f"Loading model into llama-cpp ({N_CONTEXTS} context(s); this takes ~60 s on first load)...")
+        started = time.monotonic()
+        for _ in range(N_CONTEXTS):
+            contexts.append(Llama(
+                model_path=path,
+                n_ctx=N_CTX,
+                n_threads=max(1, N_THREADS // N_CONTEXTS),
+                n_threads_batch=max(1, N_THREADS_BATCH // N_CONTEXTS),
+                n_batch=N_BATCH,
+                n_gpu_layers=0, # CPU only
+                use_mmap=USE_MMAP,
+                use_mlock=USE_MLOCK,
+                verbose=False,
+            ))
+        timings["load_seconds"] = round(time.monotonic() - started, 2)
+
+        if WARMUP:
+            server_state["status"] = "warming"
+            started = time.monotonic()
+            for llm in contexts:
+                _warmup(llm)
+            timings["warmup_seconds"] = round(time.monotonic() - started, 2)
+
+        scheduler = ContextScheduler(contexts, MAX_QUEUE_DEPTH, DEADLINE_SECONDS)
+        timings["ready_after_seconds"] = round(time.monotonic() - PROCESS_STARTED, 2)
+        server_state["status"] = "ready"
+        print(f"Diabetica-7B ready after {timings['ready_after_seconds']:.1f} s.")
+    except Exception as e:
+        server_state["status"] = "error"
+        server_state["error"] = f"{type(e).__name__}: {e}"
+        print(f"Diabetica-7B failed to load: {server_state['error']}")
+
+
+def _scheduler() -> ContextScheduler:
+    if scheduler is None:
+        raise gr.Error(f"Diabetica is not ready yet (status: {server_state['status']}); retry shortly")
+    return scheduler
+
+
+# ---------------------------------------------------------------------------
+# Inference functions — exposed as the Gradio API endpoints /api/predict
+# (whole response) and /api/predict_stream (text so far, token by token)
+# ---------------------------------------------------------------------------
+# TTFT is counted from when the stream gets a context (prefill + first token);
+# time spent queued for the context is reported separately
+stream_stats = {"streams": 0, "cancelled": 0, "first_tokens": 0, "last_ttft_seconds": None,
+                "total_ttft_seconds": 0.0, "last_queue_wait_seconds": None}
+# Streams on different contexts update stream_stats concurrently
+stream_lock = threading.Lock()
+
+
+def _prepare_prompt(llm: Llama, system_prompt: str, user_message: str):
+    """Qwen2 chat prompt for llm(); call while holding llm, as a cached prefix state may be restored into it"""
+    # Qwen2 chat template (Diabetica-7B is a Qwen2 fine-tune)
+    system_turn = f"<|im_start|>system\n{system_prompt}<|im_end|>\n<|im_start|>user\n"
+    header = next((h for h in INSTRUCTION_HEADERS if user_message.startswith(h)), "")
+    rest = f"{user_message[len(header):]}<|im_end|>\n<|im_start|>assistant\n"
+
+    if PREFIX_CACHE_ENTRIES <= 0:
+        return system_turn + header + rest
+
+    segments = [_tokenize(llm, system_turn, add_bos=True)]
+    if header:
+        segments.append(_tokenize(llm, header))
+    prefix, reused, saved = _restore_prefix(llm, segments)
+    # llama-cpp skips the tokens it already holds, so only `rest` is prefilled
+    prompt = prefix + _tokenize(llm, rest)
+    print(f"Prefix cache {'hit' if saved else 'miss'}: {reused} of {len(prefix)} prefix tokens restored, "
+          f"{saved:.1f} s prefill saved, {len(prompt) - reused} tokens to prefill")
+    return prompt
+
+
+def _sampling(max_tokens, temperature, deadline) -> dict:
+    return {
+        "stopping_criteria": _scheduler().stopping_criteria(deadline),
+        "max_tokens": int(max_tokens),
+        "temperature": float(temperature),
+        "top_p": 0.9,
+        "stop": ["<|im_end|>", "<|im_start|>"],
+        "echo": False,
+    }
+
+
 def generate(system_prompt: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.3) -> str:
     """Generate a Diabetica-7B response.
 
@@ -63,27 +451,78 @@ def generate(system_prompt: str, user_message: str, max_tokens: int = 1024, temp
     Returns:
         Model response string
     """
-    # Qwen2 chat template (Diabetica-7B is a Qwen2 fine-tune)
-    prompt = (
-        f"<|im_start|>system\n{system_prompt}<|im_end|>\n"
-        f"<|im_start|>user\n{user_message}<|im_end|>\n"
-        f"<|im_start|>assistant\n"
-    )
-
-    output = llm(
-        prompt,
-        max_tokens=int(max_tokens),
-        temperature=float(temperature),
-        top_p=0.9,
-        stop=["<|im_end|>", "<|im_start|>"],
-        echo=False,
-    )
+    arrived = time.monotonic()
+    with _scheduler().slot(arrived) as (llm, deadline):
+        output = llm(_prepare_prompt(llm, system_prompt, user_message),
+                     **_sampling(max_tokens, temperature, deadline))
 
     return output["choices"][0]["text"].strip()
 
 
+def generate_stream(system_prompt: str, user_message: str, max_tokens: int = 1024,
+                    temperature: float = 0.3) -> Iterator[str]:
+    """Stream a Diabetica-7B response, yielding the text generated so far after each token.
+
+    Takes the same arguments as generate(). Closing the stream (the Stop
+    button, or the API client cancelling its job) stops generation at the
+    next token and frees the model for the next request.
+    """
+    arrived = time.monotonic()
+    with _scheduler().slot(arrived) as (llm, deadline):
+        started = time.perf_counter()
+        queue_wait = time.monotonic() - arrived
+        with stream_lock:
+            stream_stats["last_queue_wait_seconds"] = round(queue_wait, 2)
+        stream = llm(_prepare_prompt(llm, system_prompt, user_message), stream=True,
+                     **_sampling(max_tokens, temperature, deadline))
+        text = ""
+        tokens = 0
+        finished = False
+        try:
+            for chunk in stream:
+                if tokens == 0:
+                    ttft = time.perf_counter() - started
+                    with stream_lock:
+                        stream_stats["first_tokens"] += 1
+                        stream_stats["last_ttft_seconds"] = round(ttft, 2)
+                        stream_stats["total_ttft_seconds"] += ttft
+                    print(f"Stream first token after {ttft:.1f} s (queued {queue_wait:.1f} s before that)")
+                tokens += 1
+                text += chunk["choices"][0]["text"]
+                yield text.lstrip()
+            finished = True
+        finally:
+            stream.close()
+            with stream_lock:
+                stream_stats["streams"] += 1
+                if not finished:
+                    stream_stats["cancelled"] += 1
+            print(f"Stream {'finished' if finished else 'cancelled'} after {tokens} tokens "
+                  f"in {time.perf_counter() - started:.1f} s")
+
+    yield text.strip()
+
+
 def health_check() -> str:
-    return json.dumps({"status": "ok", "model": MODEL_FILE})
+    with stream_lock:
+        streams = dict(stream_stats)
+    total_ttft = streams.pop("total_ttft_seconds")
+    first_tokens = streams.pop("first_tokens")
+    streams["mean_ttft_seconds"] = round(total_ttft / first_tokens, 2) if first_tokens else None
+    with prefix_cache.lock:
+        cache = prefix_cache.stats()
+    return json.dumps({
+        "status": server_state["status"],
+        "error": server_state["error"],
+        "model": LOCAL_MODEL_PATH or MODEL_FILE,
+        "timings": server_state["timings"],
+        "uptime_seconds": round(time.monotonic() - PROCESS_STARTED, 1),
+        "config": {"contexts": N_CONTEXTS, "n_ctx": N_CTX, "threads": N_THREADS, "threads_batch": N_THREADS_BATCH,
+                   "n_batch": N_BATCH, "tuned": bool(TUNING), "use_mmap": USE_MMAP, "use_mlock": USE_MLOCK, "offline": OFFLINE or bool(LOCAL_MODEL_PATH)},
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "prefix_cache": cache,
+        "streaming": streams,
+    })
 
 
 # ---------------------------------------------------------------------------
@@ -105,15 +544,29 @@ with gr.Blocks(title="Diabetica 7B API") as demo:
             max_tok = gr.Slider(256, 2048, value=1024, step=64, label="Max Tokens")
             temp = gr.Slider(0.0, 1.0, value=0.3, step=0.05, label="Temperature")
             btn = gr.Button("Generate", variant="primary")
+            with gr.Row():
+                stream_btn = gr.Button("Stream")
+                stop_btn = gr.Button("Stop", variant="stop")
         with gr.Column():
             out = gr.Textbox(label="Model Response", lines=20)
 
     # api_name="predict" exposes this as POST /api/predict (Gradio 3)
     # and POST /call/predict (Gradio 4+) — required for gr.Blocks
     btn.click(fn=generate, inputs=[sys_in, usr_in, max_tok, temp], outputs=out, api_name="predict")
+    # Generator endpoint: each SSE "generating" event carries the text so far
+    streaming = stream_btn.click(fn=generate_stream, inputs=[sys_in, usr_in, max_tok, temp], outputs=out,
+                                 api_name="predict_stream")
+    stop_btn.click(fn=None, inputs=None, outputs=None, cancels=[streaming])
 
     with gr.Tab("Health"):
         gr.Button("Check").click(fn=health_check, inputs=[], outputs=gr.Textbox(label="Status"), api_name="health")
 
-demo.queue()
-demo.launch(server_name="0.0.0.0", server_port=7860)
+if __name__ == "__main__":
+    # No Gradio concurrency limit: every event runs as soon as Gradio accepts it, so
+    # the scheduler is the only admission gate and its arrival time is the real one.
+    # Waiting requests each hold a worker thread, so leave room for all of them plus
+    # the fast rejections and health checks.
+    demo.queue(default_concurrency_limit=None)
+    threading.Thread(target=load_model, name="diabetica-load", daemon=True).start()
+    demo.launch(server_name="0.0.0.0", server_port=7860,
+                max_threads=max(40, 2 * (N_CONTEXTS + MAX_QUEUE_DEPTH)))
@@ -0,0 +1,254 @@
+"""Streaming bulk re-scoring of exported assessments.
+
+Reads NDJSON (one object per line: the features themselves or
+``{"features": {...}}``, plus an optional id) or CSV (a header row naming the
+feature columns) in fixed-size chunks, scores each chunk with one batched
+model call and streams the results out as NDJSON or CSV in input order.
+Only a bounded number of chunks is held in memory at any time, so memory use
+does not grow with the input size.
+
+Run from backend/DiabetesModel:
+
+    python bulk_rescore.py --input assessments.ndjson --output rescored.ndjson
+    python bulk_rescore.py --input export.csv --output rescored.csv --workers 4 --chunk-size 5000
+"""
+
+import argparse
+import collections
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_FIELDS = 'risk_level,diabetes_probability,confidence,prediction'
+DEFAULT_CHUNK_SIZE = 2000
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+# Per-process system, created by _init_worker (or once in-process without workers)
+_system = None
+
+
+def _init_worker(model_path, risk_table_path, tree_export_path):
+    global _system
+    try:
+        from .EnhancedDiabetesSystem import DiabetesRiskAssessmentSystem
+    except ImportError:
+        from EnhancedDiabetesSystem import DiabetesRiskAssessmentSystem
+
+    _system = DiabetesRiskAssessmentSystem(model_path, risk_table_path=risk_table_path,
+                                           tree_export_path=tree_export_path)
+
+
+def _csv_value(text):
+    """CSV cells are strings: empty means missing, numbers become floats, answers stay text"""
+    if text is None or text.strip() == '':
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def read_records(path, input_format, id_field='id'):
+    """
+    Yield (line number, features dict or None, id or None, error or None) for each input record
+
+    Malformed lines are reported through the error slot instead of stopping the run.
+    """
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if input_format == 'csv':
+            for line_no, row in enumerate(csv.DictReader(stream), start=2):
+                features = {key: _csv_value(value) for key, value in row.items() if key != id_field}
+                yield line_no, features, row.get(id_field), None
+            return
+
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, None, f"Invalid JSON: {str(e)}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, None, "Record must be a JSON object"
+                continue
+            features = record.get('features', record)
+            if not isinstance(features, dict):
+                yield line_no, None, record.get(id_field), "'features' must be a JSON object"
+                continue
+            yield line_no, features, record.get(id_field), None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def score_chunk(chunk, fields, id_field):
+    """
+    Score one chunk of read_records() tuples with a single batched model call
+
+    Returns:
+        Output records in input order: the id (when the input had one)
+        followed by the requested result fields, or an error with its line
+    """
+    results = iter(_system.predict_risk_batch([features for _, features, _, error in chunk if error is None],
+                                              include_importance=True, fields=fields))
+
+    output = []
+    for line_no, _, record_id, error in chunk:
+        record = {} if record_id is None else {id_field: record_id}
+        if error is None:
+            record.update(next(results))
+        else:
+            record.update({'line': line_no, 'error': error})
+        output.append(record)
+    return output
+
+
+class _Writer:
+    """NDJSON or CSV output; nested values in CSV cells are written as JSON"""
+
+    def __init__(self, path, output_format, columns):
+        self.stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        self.output_format = output_format
+        if output_format == 'csv':
+            self.csv = csv.DictWriter(self.stream, fieldnames=columns, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, records):
+        if self.output_format == 'csv':
+            self.csv.writerows(
+                {key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                 for key, value in record.items()}
+                for record in records
+            )
+        else:
+            self.stream.write(''.join(json.dumps(record) + '\n' for record in records))
+
+    def close(self):
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+class _Progress:
+    def __init__(self, interval=PROGRESS_INTERVAL_SECONDS):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.rows = 0
+        self.errors = 0
+
+    def update(self, records):
+        self.rows += len(records)
+        self.errors += sum(1 for record in records if 'error' in record)
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            print(f"Rescored {self.rows} rows ({self.rows / (now - self.started):.0f} rows/s, "
+                  f"{self.errors} errors)", file=sys.stderr)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        print(f"Done: {self.rows} rows in {elapsed:.1f}s ({self.rows / max(elapsed, 1e-9):.0f} rows/s, "
+              f"{self.errors} errors)", file=sys.stderr)
+
+
+def rescore(input_path, output_path, model_path, fields=DEFAULT_FIELDS, input_format='ndjson',
+            output_format='ndjson', chunk_size=DEFAULT_CHUNK_SIZE, workers=0, id_field='id',
+            risk_table_path=None, tree_export_path=None):
+    """
+    Re-score every record of input_path into output_path
+
+    Args:
+        fields: Result sections to write (see RESULT_FIELDS), list or comma-separated
+        chunk_size: Records per batched model call
+        workers: Worker processes to fan chunks out to (0 scores in this process)
+
+    Returns:
+        (rows written, rows with errors)
+    """
+    if isinstance(fields, str):
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+    records = read_records(input_path, input_format, id_field)
+    chunks = iter(lambda: list(itertools.islice(records, chunk_size)), [])
+
+    writer = _Writer(output_path, output_format, [id_field, *fields, 'line', 'error'])
+    progress = _Progress()
+    try:
+        if workers <= 0:
+            _init_worker(model_path, risk_table_path, tree_export_path)
+            for chunk in chunks:
+                scored = score_chunk(chunk, fields, id_field)
+                writer.write(scored)
+                progress.update(scored)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_path, risk_table_path, tree_export_path)) as pool:
+                # At most two chunks per worker are in flight; results are
+                # written in input order as the oldest one completes
+                pending = collections.deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(score_chunk, chunk, fields, id_field))
+                    if len(pending) >= 2 * workers:
+                        scored = pending.popleft().result()
+                        writer.write(scored)
+                        progress.update(scored)
+                while pending:
+                    scored = pending.popleft().result()
+                    writer.write(scored)
+                    progress.update(scored)
+    finally:
+        writer.close()
+    progress.finish()
+    return progress.rows, progress.errors
+
+
+def _detect_format(path, explicit):
+    if explicit:
+        return explicit
+    return 'csv' if str(path).lower().endswith('.csv') else 'ndjson'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score exported assessments in streaming chunks")
+    parser.add_argument('--input', required=True, help="NDJSON or CSV file ('-' for stdin)")
+    parser.add_argument('--output', required=True, help="NDJSON or CSV file ('-' for stdout)")
+    parser.add_argument('--input-format', choices=('ndjson', 'csv'), help="Default: from the file extension")
+    parser.add_argument('--output-format', choices=('ndjson', 'csv'), help="Default: from the file extension")
+    parser.add_argument('--model', default='diabetes_xgb_model.pkl', help="Trained model (.pkl, .ubj or .json)")
+    parser.add_argument('--risk-table', help="Precomputed risk table (default: diabetes_risk_table.npy next to "
+                                             "the model, when present and built from it)")
+    parser.add_argument('--trees', help="NumPy tree export (default: diabetes_trees.npz next to the model)")
+    parser.add_argument('--fields', default=DEFAULT_FIELDS, help="Comma-separated result sections to write")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Records per model call")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = score in this process)")
+    parser.add_argument('--id-field', default='id', help="Input field copied to each output record")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+    model_dir = Path(args.model).resolve().parent
+    risk_table = args.risk_table or str(model_dir / 'diabetes_risk_table.npy')
+    trees = args.trees or str(model_dir / 'diabetes_trees.npz')
+
+    rows, errors = rescore(
+        args.input, args.output, args.model, args.fields,
+        input_format=_detect_format(args.input, args.input_format),
+        output_format=_detect_format(args.output, args.output_format),
+        chunk_size=args.chunk_size, workers=args.workers, id_field=args.id_field,
+        risk_table_path=risk_table if os.path.exists(risk_table) else None,
+        tree_export_path=trees if os.path.exists(trees) else None
+    )
+    return 1 if rows and errors == rows else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Clinical pattern rules for the LLM-ensemble context, evaluated as bitmasks.
+
+Each patient's symptoms become one integer mask (bit i set when
+RULE_SYMPTOMS[i] is present) and every rule is a predicate over a group of
+bits: any of them, all of them, or how many. All groups are checked for a
+whole batch at once as one (patients x groups) matrix; the per-patient
+dictionaries are only assembled from the results.
+
+A symptom counts as present when its value == 1, which is what the
+per-patient checks have always used (so "Yes" strings do not count here).
+"""
+
+import numpy as np
+
+try:
+    from .feature_schema import FEATURE_NAMES
+except ImportError:
+    from feature_schema import FEATURE_NAMES
+
+RULE_SYMPTOMS = tuple(name for name in FEATURE_NAMES if name not in ('Age', 'Gender'))
+BITS = {name: 1 << i for i, name in enumerate(RULE_SYMPTOMS)}
+
+# Symptom groups the rules test, in GROUP_MASKS order
+_GROUPS = {}
+
+
+def group(*names):
+    """Index of the bit group covering names (registered on first use)"""
+    mask = 0
+    for name in names:
+        mask |= BITS[name]
+    return _GROUPS.setdefault(mask, len(_GROUPS))
+
+
+# (output key, group) flags set when every symptom of the group is present,
+# plus the group whose count is reported
+CLASSIC_TRIAD = tuple((key, group(name)) for key, name in (
+    ('polyuria', 'Polyuria'), ('polydipsia', 'Polydipsia'), ('polyphagia', 'Polyphagia')
+))
+CLASSIC_TRIAD_GROUP = group('Polyuria', 'Polydipsia', 'Polyphagia')
+
+METABOLIC_SYMPTOMS = tuple((key, group(name)) for key, name in (
+    ('weight_loss', 'sudden weight loss'), ('weakness', 'weakness'), ('obesity', 'Obesity')
+))
+METABOLIC_GROUP = group('sudden weight loss', 'weakness', 'Obesity')
+
+# (output key, group) flags set when any symptom of the group is present
+COMPLICATION_SIGNS = tuple((key, group(*names)) for key, names in (
+    ('vision_problems', ('visual blurring',)),
+    ('delayed_healing', ('delayed healing',)),
+    ('neuropathy_signs', ('partial paresis', 'muscle stiffness')),
+    ('infections', ('Genital thrush', 'Itching')),
+))
+COMPLICATION_GROUP = group('visual blurring', 'delayed healing', 'partial paresis', 'muscle stiffness',
+                           'Genital thrush', 'Itching')
+
+HIGH_PRIORITY_SYMPTOMS = tuple(({'symptom': name, 'reason': reason}, group(name)) for name, reason in (
+    ('Polyuria', 'Classic diabetes symptom - requires evaluation'),
+    ('Polydipsia', 'Classic diabetes symptom - requires evaluation'),
+    ('sudden weight loss', 'Concerning symptom - may indicate uncontrolled diabetes'),
+    ('visual blurring', 'Potential diabetes complication - needs ophthalmologic evaluation'),
+    ('delayed healing', 'Sign of poor glycemic control or complications'),
+))
+
+SEVERE_TRIAD_GROUP = group('Polyuria', 'Polydipsia', 'sudden weight loss')
+VISION_GROUP = group('visual blurring')
+ALL_SYMPTOMS_GROUP = group(*RULE_SYMPTOMS)
+
+# (message, predicate over a RuleBatch giving one bool per patient), in output order
+RED_FLAGS = (
+    ('Complete classic triad present - suggests significant hyperglycemia',
+     lambda batch: batch.all_of[:, SEVERE_TRIAD_GROUP]),
+    ('Very high probability with good confidence - immediate evaluation recommended',
+     lambda batch: (batch.probabilities > 0.8) & (batch.confidences > 0.7)),
+    ('Vision changes with elevated diabetes risk - urgent ophthalmologic evaluation needed',
+     lambda batch: batch.all_of[:, VISION_GROUP] & (batch.probabilities > 0.6)),
+    ('Multiple symptoms in middle-aged/older patient - comprehensive evaluation warranted',
+     lambda batch: (batch.ages > 40) & (batch.symptom_counts >= 6)),
+)
+
+GROUP_MASKS = np.array(sorted(_GROUPS, key=_GROUPS.get), dtype=np.int64)
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(1 << 8)], dtype=np.int64)
+
+
+def popcount(masks):
+    """Number of set bits of each non-negative mask below 2**32"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    return (_POPCOUNT_TABLE[masks & 0xFF] + _POPCOUNT_TABLE[(masks >> 8) & 0xFF]
+            + _POPCOUNT_TABLE[(masks >> 16) & 0xFF] + _POPCOUNT_TABLE[(masks >> 24) & 0xFF])
+
+
+def encode_symptom_masks(rows):
+    """
+    Symptom masks for symptom dictionaries
+
+    Returns:
+        (masks, ages, counts of other keys besides Age/Gender whose value == 1);
+        the last keeps the symptom count equal to the old count over every key
+    """
+    masks = np.zeros(len(rows), dtype=np.int64)
+    ages = np.zeros(len(rows), dtype=float)
+    other_present = np.zeros(len(rows), dtype=np.int64)
+    for i, symptoms_data in enumerate(rows):
+        mask = 0
+        others = 0
+        for key, value in symptoms_data.items():
+            if value == 1:
+                bit = BITS.get(key)
+                if bit is not None:
+                    mask |= bit
+                elif key not in ('Age', 'Gender'):
+                    others += 1
+        masks[i] = mask
+        other_present[i] = others
+        # A missing (None) age compares as NaN, so age rules never fire for it
+        age = symptoms_data.get('Age', 0)
+        ages[i] = np.nan if age is None else age
+    return masks, ages, other_present
+
+
+class RuleBatch:
+    """Every rule evaluated for a batch of patients; read back per patient as the context dictionaries"""
+
+    def __init__(self, rows, diabetes_probabilities, confidences):
+        """
+        Args:
+            rows: Symptom dictionaries
+            diabetes_probabilities, confidences: Per-patient values the red
+                flags compare against (as reported in the assessment result)
+        """
+        masks, self.ages, other_present = encode_symptom_masks(rows)
+        self.probabilities = np.asarray(diabetes_probabilities, dtype=float)
+        self.confidences = np.asarray(confidences, dtype=float)
+
+        hits = masks[:, None] & GROUP_MASKS
+        self.all_of = hits == GROUP_MASKS
+        counts = popcount(hits)
+        self.symptom_counts = counts[:, ALL_SYMPTOMS_GROUP] + other_present
+
+        # Plain Python rows, so assembling each dictionary is cheap indexing
+        self._all_of = self.all_of.tolist()
+        self._any_of = (hits != 0).tolist()
+        self._counts = counts.tolist()
+        self._symptom_counts = self.symptom_counts.tolist()
+        self._red_flags = np.column_stack([predicate(self) for _, predicate in RED_FLAGS]).tolist()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def classic_triad(self, i):
+        all_of = self._all_of[i]
+        triad = {key: all_of[g] for key, g in CLASSIC_TRIAD}
+        triad['present'] = self._counts[i][CLASSIC_TRIAD_GROUP]
+        triad['complete'] = all_of[CLASSIC_TRIAD_GROUP]
+        return triad
+
+    def metabolic_symptoms(self, i):
+        all_of = self._all_of[i]
+        result = {key: all_of[g] for key, g in METABOLIC_SYMPTOMS}
+        result['present_count'] = self._counts[i][METABOLIC_GROUP]
+        return result
+
+    def complication_signs(self, i):
+        any_of = self._any_of[i]
+        result = {key: any_of[g] for key, g in COMPLICATION_SIGNS}
+        result['present_count'] = self._counts[i][COMPLICATION_GROUP]
+        return result
+
+    def high_priority_symptoms(self, i):
+        all_of = self._all_of[i]
+        return [dict(entry) for entry, g in HIGH_PRIORITY_SYMPTOMS if all_of[g]]
+
+    def red_flags(self, i):
+        return [message for (message, _), fired in zip(RED_FLAGS, self._red_flags[i]) if fired]
+
+    def symptom_count(self, i):
+        return self._symptom_counts[i]
@@ -0,0 +1,182 @@
+"""Model input schema: column order, accepted answers and dtype, compiled once.
+
+FeatureSchema turns symptom dictionaries into float32 rows in the column
+order the model was trained with. String answers are matched against an
+exact-spelling table first, with a strip().lower() fallback. Anything that
+cannot be taken at face value is still encoded (as 0, what the model was
+always given) but reported through EncodingIssues, which assessment results
+carry as input_issues: missing fields, unrecognized answers, and input keys
+the model does not use.
+"""
+
+import numpy as np
+
+# Model input columns, in training order
+FEATURE_NAMES = (
+    'Age', 'Gender', 'Polyuria', 'Polydipsia', 'sudden weight loss',
+    'weakness', 'Polyphagia', 'Genital thrush', 'visual blurring',
+    'Itching', 'Irritability', 'delayed healing', 'partial paresis',
+    'muscle stiffness', 'Alopecia', 'Obesity'
+)
+
+# Accepted string answers (compared case-insensitively)
+TRUE_STRINGS = ('yes', 'true', '1')
+FALSE_STRINGS = ('no', 'false', '0')
+
+
+class EncodingIssues:
+    """Fields of one input row that could not be taken at face value"""
+
+    __slots__ = ('missing', 'unrecognized', 'extra')
+
+    def __init__(self, missing=(), unrecognized=(), extra=()):
+        self.missing = list(missing)            # expected fields absent from the input
+        self.unrecognized = list(unrecognized)  # fields whose string value is not yes/no
+        self.extra = list(extra)                # input fields the model does not use
+
+    def __bool__(self):
+        return bool(self.missing or self.unrecognized or self.extra)
+
+    def to_dict(self):
+        return {
+            'missing_fields': self.missing,
+            'unrecognized_values': self.unrecognized,
+            'unknown_fields': self.extra
+        }
+
+
+class FeatureSchema:
+    """
+    Column order, answer tables and dtype of the model input, compiled once.
+
+    Missing fields and unrecognized string answers are still encoded as 0
+    (the value the model was always given for them) but are reported through
+    EncodingIssues so callers can surface incomplete assessments.
+    """
+
+    def __init__(self, feature_names=FEATURE_NAMES, dtype=np.float32):
+        self.feature_names = tuple(str(name) for name in feature_names)
+        self.n_features = len(self.feature_names)
+        self.dtype = np.dtype(dtype)
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+
+        # Columns packed into the symptom bitmask of row_keys
+        self._key_columns = np.array(
+            [i for i, name in enumerate(self.feature_names) if name not in ('Age', 'Gender')], dtype=np.intp
+        )
+        self._key_weights = np.int64(1) << np.arange(len(self._key_columns), dtype=np.int64)
+        self._age_column = self.index.get('Age')
+        self._gender_column = self.index.get('Gender')
+
+        # Exact-match table covering the spellings the frontend sends; anything
+        # else goes through a strip().lower() fallback before being rejected
+        self.string_values = {}
+        for strings, value in ((TRUE_STRINGS, 1.0), (FALSE_STRINGS, 0.0)):
+            for text in strings:
+                for variant in (text, text.capitalize(), text.upper()):
+                    self.string_values[variant] = value
+
+    @classmethod
+    def for_model(cls, model, dtype=np.float32):
+        """Build the schema from the column order recorded in a fitted model"""
+        feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is None:
+            return cls(dtype=dtype)
+        return cls(feature_names, dtype=dtype)
+
+    def _encode_into(self, symptoms_data, out):
+        """Write one row into ``out`` (a 1-D view) and return its EncodingIssues"""
+        index = self.index
+        string_values = self.string_values
+        seen = 0
+        unrecognized = []
+        extra = []
+
+        for key, value in symptoms_data.items():
+            j = index.get(key)
+            if j is None:
+                extra.append(key)
+                continue
+            if value is None:
+                continue
+            seen += 1
+            if isinstance(value, str):
+                encoded = string_values.get(value)
+                if encoded is None:
+                    encoded = string_values.get(value.strip().lower())
+                if encoded is None:
+                    unrecognized.append(key)
+                    encoded = 0.0
+                out[j] = encoded
+            else:
+                out[j] = float(value)
+
+        missing = ()
+        if seen < self.n_features:
+            missing = [name for name in self.feature_names if symptoms_data.get(name) is None]
+        return EncodingIssues(missing, unrecognized, extra)
+
+    def encode(self, symptoms_data, out=None):
+        """
+        Encode one symptoms dictionary
+
+        Returns:
+            (feature row of shape (1, n_features), EncodingIssues)
+        """
+        if out is None:
+            out = np.zeros((1, self.n_features), dtype=self.dtype)
+        issues = self._encode_into(symptoms_data, out[0])
+        return out, issues
+
+    def encode_many(self, rows, out=None):
+        """
+        Encode many symptoms dictionaries into one matrix
+
+        Returns:
+            (matrix of shape (len(rows), n_features), list of EncodingIssues,
+            dict of row index -> error message for rows that could not be encoded)
+        """
+        if out is None:
+            out = np.zeros((len(rows), self.n_features), dtype=self.dtype)
+        issues = [None] * len(rows)
+        errors = {}
+        for i, symptoms_data in enumerate(rows):
+            try:
+                issues[i] = self._encode_into(symptoms_data, out[i])
+            except Exception as e:
+                out[i] = 0
+                errors[i] = str(e)
+        return out, issues, errors
+
+    def encode_array(self, values):
+        """Validate a matrix already in column order and cast it to the schema dtype"""
+        matrix = np.asarray(values, dtype=self.dtype)
+        if matrix.ndim != 2 or matrix.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n, {self.n_features}), got {matrix.shape}")
+        return matrix
+
+    def row_keys(self, matrix):
+        """
+        Canonical hashable key per encoded row: (symptom bitmask, age, gender)
+
+        Rows with a non-binary symptom value fall back to their raw bytes, so
+        two rows share a key only when they encode to the same vector.
+        """
+        matrix = np.asarray(matrix, dtype=self.dtype)
+        if self._age_column is None or self._gender_column is None:
+            return [row.tobytes() for row in matrix]
+
+        symptoms = matrix[:, self._key_columns]
+        binary = np.all((symptoms == 0) | (symptoms == 1), axis=1)
+        masks = symptoms.astype(np.int64) @ self._key_weights
+        keys = list(zip(masks.tolist(),
+                        matrix[:, self._age_column].tolist(),
+                        matrix[:, self._gender_column].tolist()))
+        if not binary.all():
+            for i in np.flatnonzero(~binary):
+                keys[i] = matrix[i].tobytes()
+        return keys
+
+    def to_dicts(self, matrix):
+        """Turn a column-ordered matrix back into symptoms dictionaries"""
+        return [dict(zip(self.feature_names, row)) for row in matrix.tolist()]
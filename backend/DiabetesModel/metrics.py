@@ -0,0 +1,151 @@
+"""Fixed-bucket latency and size histograms, with a Prometheus text dump.
+
+Histogram backs the micro-batcher's batch-size and queue-wait statistics.
+StageMetrics keeps one histogram per assessment stage and wraps the methods
+EnhancedDiabetesSystem.enable_stage_metrics() instruments; it is only
+created when stage metrics are turned on (ML_STAGE_METRICS=true), so the
+default path carries no timing overhead.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# Stage latency buckets in seconds (Prometheus convention), 10 us to 2.5 s
+STAGE_SECONDS_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                         0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram for tuning and monitoring.
+
+    Observations are counted into the first bucket whose upper bound they do
+    not exceed (plus an overflow bucket); quantiles are reported as that
+    bucket's upper bound, which is what a Prometheus histogram would give.
+    Safe to share between threads.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(sorted(bounds))
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf for the overflow bucket)"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """Counts per bucket ("<=bound", last one "+Inf"), count, sum, mean and p50/p95/p99"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            value_sum = self._sum
+        labels = [f"<={bound:g}" for bound in self.bounds] + ['+Inf']
+        return {
+            'count': total,
+            'sum': round(value_sum, 6),
+            'mean': round(value_sum / total, 6) if total else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip(labels, counts))
+        }
+
+    def to_prometheus(self, name, labels=''):
+        """
+        Prometheus text exposition lines (cumulative _bucket, _sum, _count)
+
+        Args:
+            labels: Extra labels already formatted, e.g. 'stage="encode"'
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            value_sum = self._sum
+        prefix = f"{labels}," if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ''
+        lines.append(f"{name}_sum{suffix} {value_sum!r}")
+        lines.append(f"{name}_count{suffix} {total}")
+        return lines
+
+
+class StageMetrics:
+    """
+    Latency histograms per named stage, exported as one Prometheus histogram
+    with a "stage" label.
+
+    timed() wraps a callable so each call is observed under its stage; code
+    that is never wrapped pays nothing.
+    """
+
+    def __init__(self, name='diabetes_assessment_stage_seconds',
+                 description='Wall time of each assessment stage', bounds=STAGE_SECONDS_BUCKETS):
+        self.name = name
+        self.description = description
+        self.bounds = tuple(bounds)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram(self.bounds)
+            return self.histograms[stage]
+
+    def timed(self, stage, fn):
+        """fn, with the wall time of every call (including ones that raise) observed under stage"""
+        observe = self.histogram(stage).observe
+        clock = time.perf_counter
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(clock() - started)
+
+        return wrapper
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {stage: histogram.snapshot() for stage, histogram in histograms.items()}
+
+    def to_prometheus(self):
+        with self._lock:
+            histograms = dict(self.histograms)
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for stage, histogram in histograms.items():
+            lines.extend(histogram.to_prometheus(self.name, f'stage="{stage}"'))
+        return '\n'.join(lines) + '\n'
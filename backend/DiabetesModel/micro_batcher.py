@@ -0,0 +1,147 @@
+"""Micro-batching of concurrent single-patient assessments.
+
+The inference server (services/ml/inference_server.py) submits each /predict
+request here instead of scoring it on its own; a single scoring thread
+drains the queue into predict_risk_batch calls. Batch sizes and queue waits
+are kept as histograms and reported in the server's /healthz.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from .metrics import Histogram
+except ImportError:
+    from metrics import Histogram
+
+# Histogram buckets: rows per model call, and milliseconds a request waited to be scored
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+QUEUE_WAIT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class _Request:
+    __slots__ = ('symptoms_data', 'include_importance', 'fields', 'future', 'enqueued_at')
+
+    def __init__(self, symptoms_data, include_importance, fields):
+        self.symptoms_data = symptoms_data
+        self.include_importance = include_importance
+        self.fields = fields
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-patient assessments into batch model calls.
+
+    Requests are queued; a scoring thread takes the oldest one, keeps
+    collecting until max_wait_ms has passed since it arrived or
+    max_batch_size requests are waiting, then scores them all with one
+    predict_risk_batch call and hands each caller its own result. While a
+    batch is being scored the next one accumulates, so batches grow with
+    load and a lone request waits at most max_wait_ms.
+    """
+
+    def __init__(self, system, max_wait_ms=2.0, max_batch_size=64):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive")
+        self.system = system
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = int(max_batch_size)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, symptoms_data, include_importance=True, fields=None):
+        """
+        Queue one assessment
+
+        Returns:
+            concurrent.futures.Future resolving to the same dictionary
+            predict_risk_with_confidence would return
+
+        Raises:
+            ValueError: If fields names an unknown section (raised here, not
+                through the future, so one bad request never fails a batch)
+            RuntimeError: After close()
+        """
+        request = _Request(symptoms_data, bool(include_importance), self.system._resolve_fields(fields))
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put(request)
+        return request.future
+
+    def predict(self, symptoms_data, include_importance=True, fields=None, timeout=None):
+        """Blocking submit(); drop-in for predict_risk_with_confidence"""
+        return self.submit(symptoms_data, include_importance, fields).result(timeout)
+
+    def close(self):
+        """Score everything already queued, then stop the scoring thread"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot()
+        }
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+
+            batch = [request]
+            deadline = request.enqueued_at + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            self._score(batch)
+            if stopping:
+                return
+
+    def _score(self, batch):
+        started = time.monotonic()
+        self.batch_sizes.observe(len(batch))
+        for request in batch:
+            self.queue_wait_ms.observe((started - request.enqueued_at) * 1000.0)
+
+        # One model call per distinct option set; normally there is just one
+        groups = {}
+        for request in batch:
+            groups.setdefault((request.include_importance, request.fields), []).append(request)
+
+        for (include_importance, fields), requests in groups.items():
+            try:
+                results = self.system.predict_risk_batch(
+                    [request.symptoms_data for request in requests], include_importance, fields
+                )
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(requests, results):
+                request.future.set_result(result)
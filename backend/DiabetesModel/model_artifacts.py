@@ -0,0 +1,166 @@
+"""Native XGBoost model artifacts with a verified sidecar manifest.
+
+The shipped model is a joblib pickle of the sklearn XGBClassifier wrapper.
+Unpickling it runs arbitrary code, ties the file to the exact sklearn and
+xgboost versions that wrote it, and needs the whole sklearn stack. The
+converter saves the booster in XGBoost's own UBJSON (or JSON) format instead,
+next to ``<artifact>.manifest.json`` which records the feature order, the
+risk thresholds, the objective and the artifact's SHA-256. The manifest is
+checked before the booster is loaded.
+
+Convert (from backend/DiabetesModel):
+
+    python model_artifacts.py --model diabetes_xgb_model.pkl --output diabetes_xgb_model.ubj
+
+Compare load times with ``python benchmarks.py load-time``.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .feature_schema import FEATURE_NAMES
+    from .risk_table import model_fingerprint
+except ImportError:
+    from feature_schema import FEATURE_NAMES
+    from risk_table import model_fingerprint
+
+MANIFEST_VERSION = 1
+NATIVE_SUFFIXES = ('.ubj', '.json')
+
+# Same cut-offs as DiabetesRiskAssessmentSystem.risk_thresholds
+DEFAULT_RISK_THRESHOLDS = {'low': 0.3, 'moderate': 0.7, 'high': 0.9}
+
+
+def manifest_path(artifact_path):
+    return Path(str(artifact_path) + '.manifest.json')
+
+
+def is_native_artifact(model_path):
+    return Path(model_path).suffix.lower() in NATIVE_SUFFIXES
+
+
+class NativeBoosterModel:
+    """
+    Booster loaded from a native artifact, exposing the parts of the
+    XGBClassifier interface the assessment system uses
+    """
+
+    def __init__(self, booster, manifest):
+        self._booster = booster
+        self.manifest = manifest
+        self.feature_names_in_ = np.array(manifest['feature_names'], dtype=object)
+
+    def get_booster(self):
+        return self._booster
+
+    def predict_proba(self, X):
+        """(n, 2) class probabilities, identical to XGBClassifier.predict_proba"""
+        positive = self._booster.inplace_predict(np.asarray(X, dtype=np.float32))
+        return np.column_stack((1 - positive, positive))
+
+
+def read_manifest(artifact_path):
+    """Parse the sidecar manifest of a native artifact"""
+    manifest = json.loads(manifest_path(artifact_path).read_text())
+    if manifest.get('format_version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported model manifest format: {manifest.get('format_version')}")
+    return manifest
+
+
+def load_native_model(artifact_path):
+    """
+    Load a converted booster after verifying its manifest
+
+    Raises:
+        ValueError: If the manifest format is unknown or the artifact hash does not match
+    """
+    manifest = read_manifest(artifact_path)
+    if manifest['sha256'] != model_fingerprint(artifact_path):
+        raise ValueError(f"Model artifact {artifact_path} does not match its manifest hash")
+
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(str(artifact_path))
+    booster.feature_names = list(manifest['feature_names'])
+    return NativeBoosterModel(booster, manifest)
+
+
+def load_model(model_path):
+    """Load either a native artifact (.ubj/.json with manifest) or a legacy joblib pickle"""
+    if is_native_artifact(model_path):
+        return load_native_model(model_path)
+
+    import joblib
+
+    return joblib.load(model_path)
+
+
+def convert_pickle(pickle_path, output_path, risk_thresholds=None):
+    """
+    Convert a pickled XGBClassifier to a native artifact plus manifest
+
+    Returns:
+        The manifest dictionary
+    """
+    import joblib
+    import xgboost as xgb
+
+    output_path = Path(output_path)
+    if output_path.suffix.lower() not in NATIVE_SUFFIXES:
+        raise ValueError(f"Output must end with one of {NATIVE_SUFFIXES}")
+
+    model = joblib.load(pickle_path)
+    booster = model.get_booster()
+    booster.save_model(str(output_path))
+
+    feature_names = getattr(model, 'feature_names_in_', None)
+    feature_names = list(FEATURE_NAMES) if feature_names is None else [str(name) for name in feature_names]
+    config = json.loads(booster.save_config())
+
+    manifest = {
+        'format_version': MANIFEST_VERSION,
+        'format': output_path.suffix.lower().lstrip('.'),
+        'sha256': model_fingerprint(output_path),
+        'source_sha256': model_fingerprint(pickle_path),
+        'feature_names': feature_names,
+        'objective': config['learner']['objective']['name'],
+        'risk_thresholds': dict(risk_thresholds or DEFAULT_RISK_THRESHOLDS),
+        'xgboost_version': xgb.__version__,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    manifest_path(output_path).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the pickled model to a native XGBoost artifact")
+    parser.add_argument('--model', default='diabetes_xgb_model.pkl', help="Pickled XGBClassifier")
+    parser.add_argument('--output', default='diabetes_xgb_model.ubj', help="Artifact to write (.ubj or .json)")
+    args = parser.parse_args(argv)
+
+    manifest = convert_pickle(args.model, args.output)
+
+    # Round-trip check: the native booster must score exactly like the pickle
+    import joblib
+
+    rng = np.random.default_rng(0)
+    sample = rng.integers(0, 2, size=(10000, len(manifest['feature_names']))).astype(np.float32)
+    sample[:, manifest['feature_names'].index('Age')] = rng.integers(16, 91, size=len(sample))
+    max_error = float(np.max(np.abs(
+        load_native_model(args.output).predict_proba(sample) - joblib.load(args.model).predict_proba(sample)
+    )))
+    print(f"Wrote {args.output} and {manifest_path(args.output).name} "
+          f"(max |native - pickle| = {max_error:.2e})", file=sys.stderr)
+    if max_error > 1e-6:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Fixed-layout binary records for batch scoring.
+
+A compact alternative to JSON for batches sent by the Node backend (see
+services/mlService.js). Each patient is one little-endian 8-byte record:
+
+    symptoms  uint16   bit i = SYMPTOM_NAMES[i] answered yes, bit 14 = Gender
+    answered  uint16   same bit layout, set when the field was given; bit 15 = Age
+    age       float32
+
+and each result is one 10-byte record, in input order:
+
+    probability  float32  diabetes probability (unrounded)
+    confidence   float32
+    risk_code    uint8    index into DiabetesRiskAssessmentSystem.RISK_LEVELS
+    flags        uint8    FLAG_INCOMPLETE when any field was unanswered
+
+Unanswered fields are scored as 0, the same as a missing dictionary key.
+"""
+
+import numpy as np
+
+try:
+    from .feature_schema import FEATURE_NAMES, FeatureSchema
+except ImportError:
+    from feature_schema import FEATURE_NAMES, FeatureSchema
+
+RECORDS_CONTENT_TYPE = 'application/x-diabetes-records'
+RESULTS_CONTENT_TYPE = 'application/x-diabetes-results'
+
+# Bit order of the symptom mask; JavaScript clients must use the same order
+SYMPTOM_NAMES = tuple(name for name in FEATURE_NAMES if name not in ('Age', 'Gender'))
+GENDER_BIT = 14
+AGE_BIT = 15
+ALL_ANSWERED = (1 << 16) - 1
+
+RECORD_DTYPE = np.dtype([('symptoms', '<u2'), ('answered', '<u2'), ('age', '<f4')])
+RESULT_DTYPE = np.dtype([('probability', '<f4'), ('confidence', '<f4'), ('risk_code', 'u1'), ('flags', 'u1')])
+
+FLAG_INCOMPLETE = 1
+
+_SHIFTS = np.arange(len(SYMPTOM_NAMES) + 1, dtype=np.uint16)
+
+
+def unpack_records(buffer, schema):
+    """
+    Decode packed records into a model input matrix
+
+    Args:
+        buffer: bytes-like holding whole RECORD_DTYPE records (viewed, not copied)
+        schema: FeatureSchema giving the matrix column order
+
+    Returns:
+        (feature matrix of shape (n, schema.n_features), bool array that is
+        True for rows with every field answered)
+
+    Raises:
+        ValueError: If the buffer is not a whole number of records
+    """
+    if len(memoryview(buffer).cast('B')) % RECORD_DTYPE.itemsize:
+        raise ValueError(f"Packed records must be a multiple of {RECORD_DTYPE.itemsize} bytes")
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPE)
+
+    # Symptom bits and the gender bit, one column each, answered or not
+    columns = [schema.index[name] for name in SYMPTOM_NAMES] + [schema.index['Gender']]
+    bits = (records['symptoms'][:, None] >> _SHIFTS) & 1
+    matrix = np.zeros((len(records), schema.n_features), dtype=schema.dtype)
+    matrix[:, columns] = bits
+    answered = records['answered']
+    matrix[:, schema.index['Age']] = np.where(answered & (1 << AGE_BIT), records['age'], 0)
+    return matrix, answered == ALL_ANSWERED
+
+
+def pack_records(rows):
+    """
+    Encode symptom dictionaries as packed records (for Python clients and benchmarks)
+
+    Symptoms count as yes when they encode to a positive value through
+    FeatureSchema; a Gender of 1 sets the gender bit.
+    """
+    schema = FeatureSchema()
+    matrix, issues, errors = schema.encode_many(rows)
+    if errors:
+        row, message = next(iter(errors.items()))
+        raise ValueError(f"Row {row} could not be encoded: {message}")
+
+    columns = [schema.index[name] for name in SYMPTOM_NAMES] + [schema.index['Gender']]
+    weights = np.uint32(1) << _SHIFTS.astype(np.uint32)
+    records = np.zeros(len(rows), dtype=RECORD_DTYPE)
+    records['symptoms'] = (matrix[:, columns] > 0).astype(np.uint32) @ weights
+    records['age'] = matrix[:, schema.index['Age']]
+
+    answered = np.full(len(rows), ALL_ANSWERED, dtype=np.uint16)
+    bit_of = {name: i for i, name in enumerate(SYMPTOM_NAMES)}
+    bit_of['Gender'] = GENDER_BIT
+    bit_of['Age'] = AGE_BIT
+    for i, row_issues in enumerate(issues):
+        for name in row_issues.missing:
+            answered[i] &= ~np.uint16(1 << bit_of[name])
+    records['answered'] = answered
+    return records.tobytes()
+
+
+def pack_results(probabilities, risk_codes, confidences, complete):
+    """Packed RESULT_DTYPE records for scored rows"""
+    results = np.empty(len(probabilities), dtype=RESULT_DTYPE)
+    results['probability'] = probabilities
+    results['confidence'] = confidences
+    results['risk_code'] = risk_codes
+    results['flags'] = np.where(complete, 0, FLAG_INCOMPLETE)
+    return results.tobytes()
+
+
+def unpack_results(buffer):
+    """View packed results as a RESULT_DTYPE structured array"""
+    return np.frombuffer(buffer, dtype=RESULT_DTYPE)
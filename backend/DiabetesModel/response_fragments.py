@@ -0,0 +1,112 @@
+"""Shared, pre-encoded sections of assessment results.
+
+Recommendations and educational content depend only on the risk level and
+which symptoms are named, so there are few distinct ones. Each is built once,
+frozen (so the single shared copy can sit in every result without one caller
+corrupting another's), and JSON-encoded once. FragmentEncoder.dumps then
+serializes a result by splicing that text in, so only the per-patient values
+(probability, importance, summary, timestamp) are encoded per response.
+"""
+
+import json
+import threading
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} is a shared result section and cannot be modified; copy it first")
+
+
+class FrozenDict(dict):
+    """dict that rejects mutation; serializes, compares and copies like a dict"""
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    """list that rejects mutation; serializes, compares and copies like a list"""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = sort = reverse = _immutable
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+
+def freeze(value):
+    """Recursively convert dicts and lists to their frozen counterparts"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+class FragmentEncoder:
+    """Registry of shared result sections and a json.dumps that splices them in"""
+
+    def __init__(self, max_sections=4096):
+        self.max_sections = max_sections
+        self._sections = {}
+        # id(section) -> (section, JSON text); holding the section keeps its id from being reused
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def section(self, key, build):
+        """
+        Shared frozen section for key, built and pre-encoded on first use
+
+        Args:
+            key: Hashable description of everything the section depends on
+            build: Called once to create the section for a new key
+
+        Beyond max_sections distinct keys, sections are still frozen but built
+        per call and encoded normally.
+        """
+        frozen = self._sections.get(key)
+        if frozen is not None:
+            return frozen
+
+        frozen = freeze(build())
+        with self._lock:
+            if key in self._sections:
+                return self._sections[key]
+            if len(self._sections) < self.max_sections:
+                self._sections[key] = frozen
+                self._encoded[id(frozen)] = (frozen, json.dumps(frozen))
+        return frozen
+
+    def dumps(self, value, depth=1):
+        """
+        Same text as json.dumps(value) with default settings
+
+        Shared sections are looked for up to depth container levels down; the
+        rest is encoded with one json.dumps call per run of ordinary items.
+        """
+        entry = self._encoded.get(id(value))
+        if entry is not None:
+            return entry[1]
+        if depth <= 0:
+            return json.dumps(value)
+        if type(value) is list:
+            return '[' + ', '.join(self.dumps(item, depth - 1) for item in value) + ']'
+        if type(value) is not dict:
+            return json.dumps(value)
+
+        parts = []
+        run = {}
+        for key, item in value.items():
+            entry = self._encoded.get(id(item))
+            if entry is None and (depth == 1 or type(item) not in (dict, list)):
+                run[key] = item
+                continue
+            if run:
+                parts.append(json.dumps(run)[1:-1])
+                run = {}
+            parts.append(f"{json.dumps(key)}: {entry[1] if entry is not None else self.dumps(item, depth - 1)}")
+        if run:
+            parts.append(json.dumps(run)[1:-1])
+        return '{' + ', '.join(parts) + '}'
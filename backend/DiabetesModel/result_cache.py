@@ -0,0 +1,94 @@
+"""Opt-in memo of model outputs for repeated assessments.
+
+The model input space is small (Gender plus 14 binary symptoms and an age),
+so identical feature vectors recur often. DiabetesRiskAssessmentSystem
+consults this cache per encoded row when created with cache_size > 0 (the
+worker reads ML_RESULT_CACHE_SIZE and ML_RESULT_CACHE_TTL), keyed by
+FeatureSchema.row_keys; hit/miss counters are reported by cache_stats().
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU memo of model outputs, keyed by canonical feature vectors.
+
+    Only model-derived values are stored (probability, risk code, confidence,
+    SHAP contributions); response fields such as the timestamp are rebuilt for
+    every request. Safe to share between threads.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self.max_size = int(max_size)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, is_usable=None):
+        """
+        Return the cached value for key, or None on a miss
+
+        Args:
+            key: Hashable feature key (see FeatureSchema.row_keys)
+            is_usable: Optional predicate; an entry failing it (for example one
+                stored without contributions) counts as a miss and is kept
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if is_usable is not None and not is_usable(value):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters for monitoring; hit_rate is over all lookups so far"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
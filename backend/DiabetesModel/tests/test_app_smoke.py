@@ -0,0 +1,143 @@
+import importlib
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip('gradio')
+pytest.importorskip('llama_cpp')
+gguf = pytest.importorskip('gguf')
+
+SYSTEM_PROMPT = "You are a diabetes risk assistant."
+USER_MESSAGE = "# Diabetes Risk Assessment Validation\n\n## Patient Profile\n- Age: 54\n- BMI: 31.2\n"
+
+# Tiny llama-architecture model: byte-fallback vocabulary plus the Qwen2 chat markers
+N_EMBD, N_HEAD, N_LAYER, N_FF = 64, 4, 2, 128
+SPECIAL_TOKENS = ['<unk>', '<s>', '</s>']
+CHAT_TOKENS = ['<|im_start|>', '<|im_end|>']
+BYTE_TOKENS = [f'<0x{b:02X}>' for b in range(256)]
+
+
+def write_tiny_gguf(path):
+    """Random-weight model that never emits EOS or a chat marker, so greedy output always runs to max_tokens"""
+    tokens = SPECIAL_TOKENS + BYTE_TOKENS + CHAT_TOKENS
+    types = [2, 3, 3] + [6] * len(BYTE_TOKENS) + [3] * len(CHAT_TOKENS)
+    rng = np.random.default_rng(0)
+
+    def weight(*shape):
+        return (rng.standard_normal(shape) / np.sqrt(shape[-1])).astype(np.float32)
+
+    writer = gguf.GGUFWriter(str(path), 'llama')
+    writer.add_context_length(2048)
+    writer.add_embedding_length(N_EMBD)
+    writer.add_block_count(N_LAYER)
+    writer.add_feed_forward_length(N_FF)
+    writer.add_head_count(N_HEAD)
+    writer.add_head_count_kv(N_HEAD)
+    writer.add_rope_dimension_count(N_EMBD // N_HEAD)
+    writer.add_layer_norm_rms_eps(1e-5)
+    writer.add_file_type(gguf.LlamaFileType.ALL_F32)
+    writer.add_tokenizer_model('llama')
+    writer.add_token_list(tokens)
+    writer.add_token_scores([0.0] * len(tokens))
+    writer.add_token_types(types)
+    writer.add_unk_token_id(0)
+    writer.add_bos_token_id(1)
+    writer.add_eos_token_id(2)
+    writer.add_add_bos_token(True)
+    # Tokenizing the prompt in segments then matches tokenizing it whole, as with Qwen2's BPE
+    writer.add_add_space_prefix(False)
+
+    writer.add_tensor('token_embd.weight', weight(len(tokens), N_EMBD))
+    for i in range(N_LAYER):
+        writer.add_tensor(f'blk.{i}.attn_norm.weight', np.ones(N_EMBD, dtype=np.float32))
+        for name in ('attn_q', 'attn_k', 'attn_v', 'attn_output'):
+            writer.add_tensor(f'blk.{i}.{name}.weight', weight(N_EMBD, N_EMBD))
+        writer.add_tensor(f'blk.{i}.ffn_norm.weight', np.ones(N_EMBD, dtype=np.float32))
+        writer.add_tensor(f'blk.{i}.ffn_gate.weight', weight(N_FF, N_EMBD))
+        writer.add_tensor(f'blk.{i}.ffn_up.weight', weight(N_FF, N_EMBD))
+        writer.add_tensor(f'blk.{i}.ffn_down.weight', weight(N_EMBD, N_FF))
+    writer.add_tensor('output_norm.weight', np.ones(N_EMBD, dtype=np.float32))
+    # Byte rows come in +/- pairs, so some byte logit is always >= 0, the logit of
+    # every zero special/chat row; greedy decoding therefore only ever picks bytes
+    output = np.zeros((len(tokens), N_EMBD), dtype=np.float32)
+    half = weight(len(BYTE_TOKENS) // 2, N_EMBD)
+    first_byte = len(SPECIAL_TOKENS)
+    output[first_byte:first_byte + len(BYTE_TOKENS):2] = half
+    output[first_byte + 1:first_byte + len(BYTE_TOKENS):2] = -half
+    writer.add_tensor('output.weight', output)
+
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    """app.py configured for the tiny model on one context, loaded the way the Space loads it"""
+    build_dir = tmp_path_factory.mktemp('llm')
+    model_path = build_dir / 'tiny-llama.gguf'
+    write_tiny_gguf(model_path)
+    env = {
+        'DIABETICA_MODEL_PATH': str(model_path),
+        'DIABETICA_TUNING_FILE': str(build_dir / 'no-tuning.json'),
+        'DIABETICA_CONTEXTS': '1',
+        'DIABETICA_CTX': '1024',
+        'DIABETICA_THREADS': '1',
+        'DIABETICA_WARMUP': 'true',
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in env.items():
+            mp.setenv(name, value)
+        module = importlib.import_module('app')
+        assert module.LOCAL_MODEL_PATH == str(model_path), "app was imported before the test configured it"
+        module.load_model()
+        yield module
+
+
+def test_load_model_reaches_ready(app):
+    assert app.server_state['status'] == 'ready', app.server_state['error']
+    assert {'resolve_seconds', 'load_seconds', 'warmup_seconds', 'ready_after_seconds'} <= set(
+        app.server_state['timings'])
+    assert len(app.contexts) == 1
+    assert json.loads(app.health_check())['status'] == 'ready'
+
+
+def test_prefix_hit_matches_full_prefill(app):
+    hits = app.prefix_cache.hits
+    first = app.generate(SYSTEM_PROMPT, USER_MESSAGE, max_tokens=16, temperature=0.0)
+    second = app.generate(SYSTEM_PROMPT, USER_MESSAGE, max_tokens=16, temperature=0.0)
+    assert app.prefix_cache.hits > hits
+
+    llm = app.contexts[0]
+    llm.reset()
+    prompt = (f"<|im_start|>system\n{SYSTEM_PROMPT}<|im_end|>\n<|im_start|>user\n"
+              f"{USER_MESSAGE}<|im_end|>\n<|im_start|>assistant\n")
+    uncached = llm(prompt, max_tokens=16, temperature=0.0, top_p=0.9, echo=False)
+    assert second == first == uncached['choices'][0]['text'].strip()
+
+
+def test_closing_stream_releases_context(app):
+    cancelled = app.stream_stats['cancelled']
+    stream = app.generate_stream(SYSTEM_PROMPT, USER_MESSAGE, max_tokens=64, temperature=0.0)
+    next(stream)
+    next(stream)
+    assert app.scheduler.stats()['running'] == 1
+    stream.close()
+
+    assert app.stream_stats['cancelled'] == cancelled + 1
+    stats = app.scheduler.stats()
+    assert stats['running'] == 0 and stats['queue_depth'] == 0
+    # The only context is free again
+    admitted = stats['admitted']
+    app.generate(SYSTEM_PROMPT, "Hello", max_tokens=4, temperature=0.0)
+    assert app.scheduler.stats()['admitted'] == admitted + 1
+
+
+def test_generation_stops_at_deadline(app, monkeypatch):
+    # Expires during prefill, so generation stops at its first token instead of running to max_tokens
+    monkeypatch.setattr(app.scheduler, 'deadline_seconds', 0.001)
+    stopped = app.scheduler.stats()['stopped_at_deadline']
+    app.generate(SYSTEM_PROMPT, USER_MESSAGE, max_tokens=512, temperature=0.0)
+    assert app.scheduler.stats()['stopped_at_deadline'] == stopped + 1
@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks import DEFAULT_IMPORT_BUDGET_MS, HEAVY_MODULES, measure_import_time
+
+
+@pytest.fixture(scope='module')
+def import_profile():
+    # Best of three cold interpreters, so one slow start does not fail the budget
+    runs = [measure_import_time('EnhancedDiabetesSystem') for _ in range(3)]
+    return min(total_ms for total_ms, _ in runs), runs[0][1]
+
+
+@pytest.mark.parametrize('package', HEAVY_MODULES)
+def test_inference_import_skips_heavy_package(import_profile, package):
+    _, modules = import_profile
+    assert not any(name == package or name.startswith(package + '.') for name in modules), \
+        f"import EnhancedDiabetesSystem pulls in {package}"
+
+
+def test_inference_import_within_budget(import_profile):
+    total_ms, _ = import_profile
+    assert total_ms <= DEFAULT_IMPORT_BUDGET_MS, \
+        f"import EnhancedDiabetesSystem took {total_ms:.1f} ms, over the {DEFAULT_IMPORT_BUDGET_MS} ms budget"
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('xgboost')
+
+from benchmarks import random_feature_matrix
+from EnhancedDiabetesSystem import DiabetesRiskAssessmentSystem
+from model_artifacts import convert_pickle, load_model
+from risk_table import model_fingerprint
+from tree_evaluator import TreeEnsemble, export_trees
+
+TOLERANCE = 1e-6
+
+
+@pytest.fixture(scope='module')
+def artifacts(model_dir, tmp_path_factory):
+    """Native model and tree export built from the tracked pickle (both are gitignored build outputs)"""
+    pickle_path = model_dir / 'diabetes_xgb_model.pkl'
+    if not pickle_path.exists():
+        pytest.skip("No trained model pickle")
+    build_dir = tmp_path_factory.mktemp('artifacts')
+    model_path = build_dir / 'diabetes_xgb_model.ubj'
+    convert_pickle(str(pickle_path), str(model_path))
+    export_path = build_dir / 'diabetes_trees.npz'
+    export_trees(load_model(str(model_path)), model_fingerprint(str(model_path))).save(str(export_path))
+    return str(model_path), str(export_path)
+
+
+@pytest.fixture(scope='module')
+def booster(artifacts):
+    return load_model(artifacts[0])
+
+
+@pytest.fixture(scope='module')
+def ensemble(artifacts):
+    return TreeEnsemble.load(artifacts[1], artifacts[0])
+
+
+def assert_parity(ensemble, booster, matrix):
+    expected = booster.predict_proba(matrix)
+    actual = ensemble.predict_proba(matrix)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+
+
+def test_random_rows(ensemble, booster):
+    assert_parity(ensemble, booster, random_feature_matrix(5000, seed=1))
+
+
+def test_out_of_range_ages(ensemble, booster):
+    matrix = random_feature_matrix(600, seed=2)
+    matrix[:, 0] = np.tile(np.array([-50, -1, 0, 121, 150, 1e6], dtype=matrix.dtype), 100)
+    assert_parity(ensemble, booster, matrix)
+
+
+def test_nan_inputs(ensemble, booster):
+    rng = np.random.default_rng(3)
+    matrix = random_feature_matrix(2000, seed=3)
+    matrix[rng.random(matrix.shape) < 0.2] = np.nan
+    matrix[0] = np.nan
+    assert_parity(ensemble, booster, matrix)
+
+
+@pytest.mark.parametrize('n_rows', [1, DiabetesRiskAssessmentSystem.TREE_EVALUATOR_MAX_ROWS,
+                                    DiabetesRiskAssessmentSystem.TREE_EVALUATOR_MAX_ROWS + 1, 1000])
+def test_system_routes_batches_to_matching_scorer(artifacts, booster, n_rows):
+    model_path, export_path = artifacts
+    system = DiabetesRiskAssessmentSystem(model_path, tree_export_path=export_path)
+    matrix = random_feature_matrix(n_rows, seed=4)
+    np.testing.assert_allclose(system._model_predict_proba(matrix), booster.predict_proba(matrix),
+                               rtol=0, atol=TOLERANCE)
+    # The booster is only loaded once a batch exceeds the cutoff
+    assert (system._model is not None) == (n_rows > system.TREE_EVALUATOR_MAX_ROWS)
@@ -0,0 +1,236 @@
+"""Pure-NumPy evaluator for the trained XGBoost ensemble.
+
+The booster is flattened once into a few NumPy arrays (split feature,
+threshold, children, default direction and leaf value per node, all trees
+concatenated), saved as .npz, and evaluated without importing xgboost.
+Evaluation walks every tree for every row in lock step: one gather per tree
+level, so a batch costs max_depth vectorized steps however many rows or trees
+there are.
+
+Export (from backend/DiabetesModel):
+
+    python tree_evaluator.py --model diabetes_xgb_model.pkl --output diabetes_trees.npz
+
+Parity with predict_proba is tested in tests/test_tree_evaluator.py; a speed
+comparison against the booster is in benchmarks.py
+(``python benchmarks.py tree-evaluator``). The evaluator wins for small
+batches only, so DiabetesRiskAssessmentSystem sends larger ones to the booster.
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+try:
+    from .risk_table import model_fingerprint
+except ImportError:
+    from risk_table import model_fingerprint
+
+FORMAT_VERSION = 1
+
+# Objectives whose margin is turned into a probability with the logistic function
+LOGISTIC_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+class TreeEnsemble:
+    """Flattened gradient-boosted trees with a vectorized predict_proba"""
+
+    # Rows evaluated together; keeps the (rows x trees) working set cache-sized
+    CHUNK_ROWS = 512
+
+    def __init__(self, split_feature, threshold, left, right, default_left, leaf_value,
+                 roots, base_margin, max_depth, feature_names, objective='binary:logistic', model_sha256=None):
+        self.split_feature = np.asarray(split_feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.leaf_value = np.asarray(leaf_value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_margin = np.float32(base_margin)
+        self.max_depth = int(max_depth)
+        self.feature_names = tuple(feature_names)
+        self.objective = objective
+        self.model_sha256 = model_sha256
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        self._children = np.column_stack((self.left, self.right)).ravel()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.split_feature)
+
+    def predict_margin(self, X):
+        """Raw log-odds for each row of X (shape (n, n_features))"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected an array of shape (n, {len(self.feature_names)}), got {X.shape}")
+
+        margin = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), self.CHUNK_ROWS):
+            margin[start:start + self.CHUNK_ROWS] = self._chunk_margin(X[start:start + self.CHUNK_ROWS])
+        return margin
+
+    def _chunk_margin(self, X):
+        n_features = X.shape[1]
+        flat = np.ascontiguousarray(X).ravel()
+        row_offset = (np.arange(len(X), dtype=np.int32) * n_features)[:, None]
+        has_missing = bool(np.isnan(flat).any())
+
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        # Leaves point at themselves, so walking max_depth levels parks every
+        # row on its leaf regardless of how deep each tree actually is
+        for _ in range(self.max_depth):
+            values = flat[row_offset + self.split_feature[node]]
+            go_right = ~(values < self.threshold[node])
+            if has_missing:
+                missing = np.isnan(values)
+                go_right[missing] = ~self.default_left[node[missing]]
+            node = self._children[2 * node + go_right]
+
+        return self.leaf_value[node].sum(axis=1, dtype=np.float32) + self.base_margin
+
+    def predict_proba(self, X):
+        """Class probabilities in the same (n, 2) layout as XGBClassifier.predict_proba"""
+        margin = self.predict_margin(X)
+        if self.objective not in LOGISTIC_OBJECTIVES:
+            raise ValueError(f"Unsupported objective for predict_proba: {self.objective}")
+        positive = (1.0 / (1.0 + np.exp(-margin.astype(np.float64)))).astype(np.float32)
+        return np.column_stack((1 - positive, positive))
+
+    def save(self, path):
+        np.savez(
+            path,
+            split_feature=self.split_feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            default_left=self.default_left,
+            leaf_value=self.leaf_value,
+            roots=self.roots,
+            metadata=np.array(json.dumps({
+                'format_version': FORMAT_VERSION,
+                'base_margin': float(self.base_margin),
+                'max_depth': self.max_depth,
+                'feature_names': list(self.feature_names),
+                'objective': self.objective,
+                'model_sha256': self.model_sha256,
+            }))
+        )
+
+    @classmethod
+    def load(cls, path, model_path=None, feature_names=None):
+        """
+        Load an exported ensemble
+
+        Args:
+            path: .npz written by save()
+            model_path: When given, the export must come from this exact model file
+            feature_names: When given, the export's column order must match
+
+        Raises:
+            ValueError: If the export is stale or was built for another schema
+        """
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data['metadata']))
+            if metadata.get('format_version') != FORMAT_VERSION:
+                raise ValueError(f"Unsupported tree export format: {metadata.get('format_version')}")
+            if model_path is not None and metadata.get('model_sha256') != model_fingerprint(model_path):
+                raise ValueError(f"Tree export {path} was built from a different model")
+            if feature_names is not None and tuple(feature_names) != tuple(metadata['feature_names']):
+                raise ValueError("Tree export feature order does not match the model")
+            return cls(
+                data['split_feature'], data['threshold'], data['left'], data['right'],
+                data['default_left'], data['leaf_value'], data['roots'],
+                metadata['base_margin'], metadata['max_depth'], metadata['feature_names'],
+                metadata['objective'], metadata.get('model_sha256')
+            )
+
+
+def _base_margin(base_score, objective):
+    """Convert XGBoost's stored base_score into margin space"""
+    if objective in LOGISTIC_OBJECTIVES:
+        return float(np.log(base_score / (1.0 - base_score)))
+    return float(base_score)
+
+
+def export_trees(model, model_sha256=None):
+    """
+    Flatten a trained XGBoost model (XGBClassifier or Booster) into a TreeEnsemble
+
+    Requires xgboost to be importable (only at export time).
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    learner = json.loads(booster.save_raw('json'))['learner']
+
+    objective = learner['objective']['name']
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    if int(learner['learner_model_param'].get('num_class', '0')) > 1:
+        raise ValueError("Multi-class models are not supported")
+
+    trees = learner['gradient_booster']['model']['trees']
+    split_feature, threshold, left, right, default_left, leaf_value, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+
+    for tree in trees:
+        if any(tree.get('split_type', [])):
+            raise ValueError("Categorical splits are not supported")
+        tree_left = np.asarray(tree['left_children'], dtype=np.int64)
+        tree_right = np.asarray(tree['right_children'], dtype=np.int64)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        is_leaf = tree_left == -1
+        node_ids = np.arange(len(tree_left))
+
+        # Leaves loop back to themselves; internal children become global indices
+        split_feature.append(np.where(is_leaf, 0, tree['split_indices']))
+        threshold.append(np.where(is_leaf, np.float32(0), conditions))
+        left.append(np.where(is_leaf, node_ids, tree_left) + offset)
+        right.append(np.where(is_leaf, node_ids, tree_right) + offset)
+        default_left.append(np.asarray(tree['default_left'], dtype=bool))
+        # For leaves XGBoost stores the leaf value in split_conditions
+        leaf_value.append(np.where(is_leaf, conditions, np.float32(0)))
+        roots.append(offset)
+
+        depth = np.zeros(len(tree_left), dtype=np.int64)
+        for node in node_ids:
+            if not is_leaf[node]:
+                depth[tree_left[node]] = depth[tree_right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += len(tree_left)
+
+    feature_names = booster.feature_names or [f"f{i}" for i in range(int(learner['learner_model_param']['num_feature']))]
+    return TreeEnsemble(
+        np.concatenate(split_feature), np.concatenate(threshold),
+        np.concatenate(left), np.concatenate(right),
+        np.concatenate(default_left), np.concatenate(leaf_value),
+        np.array(roots), _base_margin(base_score, objective), max_depth,
+        feature_names, objective, model_sha256
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the XGBoost model to NumPy tree arrays")
+    parser.add_argument('--model', default='diabetes_xgb_model.pkl', help="Trained model (.pkl, .ubj or .json)")
+    parser.add_argument('--output', default='diabetes_trees.npz', help="Export file to write")
+    args = parser.parse_args(argv)
+
+    try:
+        from .model_artifacts import load_model
+    except ImportError:
+        from model_artifacts import load_model
+
+    model = load_model(args.model)
+    ensemble = export_trees(model, model_fingerprint(args.model))
+    ensemble.save(args.output)
+    print(f"Wrote {args.output}: {ensemble.n_trees} trees, {ensemble.n_nodes} nodes, "
+          f"max depth {ensemble.max_depth}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
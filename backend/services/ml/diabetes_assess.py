@@ -1,67 +1,68 @@
-import sys, json, os
+import sys, json, os, signal, time, base64
 from pathlib import Path
 
-# Debug information
-print(f"Python script started", file=sys.stderr)
-print(f"PROJECT_ROOT env var: {os.getenv('PROJECT_ROOT')}", file=sys.stderr)
-print(f"Current working directory: {os.getcwd()}", file=sys.stderr)
-
-PROJECT_ROOT = os.getenv('PROJECT_ROOT')
-if PROJECT_ROOT:
-    model_path = str(Path(PROJECT_ROOT) / 'DiabetesModel')
-    sys.path.append(model_path)
-    print(f"Added to Python path: {model_path}", file=sys.stderr)
-else:
-    # Fallback: try to find the model directory relative to current script
-    script_dir = Path(__file__).parent
-    project_root = script_dir.parent.parent
-    model_path = str(project_root / 'DiabetesModel')
-    sys.path.append(model_path)
-    PROJECT_ROOT = str(project_root)
-    print(f"Using fallback path: {model_path}", file=sys.stderr)
-
-# Try multiple import methods
-DiabetesRiskAssessmentSystem = None
-import_success = False
-
-# Method 1: Direct import
+# Progress/debug output on stderr is off by default; set ML_DEBUG=true to trace
+DEBUG = os.getenv('ML_DEBUG', '').lower() == 'true'
+
+def _debug(message):
+    if DEBUG:
+        print(message, file=sys.stderr)
+
+# PROJECT_ROOT is the backend directory; fall back to this script's location
+PROJECT_ROOT = os.getenv('PROJECT_ROOT') or str(Path(__file__).resolve().parent.parent.parent)
+MODEL_DIR = str(Path(PROJECT_ROOT) / 'DiabetesModel')
+if MODEL_DIR not in sys.path:
+    sys.path.insert(0, MODEL_DIR)
+_debug(f"PROJECT_ROOT: {PROJECT_ROOT}, cwd: {os.getcwd()}")
+
 try:
     from EnhancedDiabetesSystem import DiabetesRiskAssessmentSystem
-    print("Successfully imported EnhancedDiabetesSystem (method 1)", file=sys.stderr)
-    import_success = True
 except Exception as e:
-    print(f"Import method 1 failed: {str(e)}", file=sys.stderr)
+    print(f"Failed to import EnhancedDiabetesSystem from {MODEL_DIR}: {str(e)}", file=sys.stderr)
+    print(json.dumps({"error": "Failed to import EnhancedDiabetesSystem module"}))
+    sys.exit(1)
 
-# Method 2: Import the module first, then get the class
-if not import_success:
-    try:
-        import EnhancedDiabetesSystem
-        DiabetesRiskAssessmentSystem = EnhancedDiabetesSystem.DiabetesRiskAssessmentSystem
-        print("Successfully imported EnhancedDiabetesSystem (method 2)", file=sys.stderr)
-        import_success = True
-    except Exception as e:
-        print(f"Import method 2 failed: {str(e)}", file=sys.stderr)
+def _resolve_model_path():
+    """ML_MODEL_PATH, else the converted diabetes_xgb_model.ubj when present, else the legacy pickle"""
+    if os.getenv('ML_MODEL_PATH'):
+        return os.getenv('ML_MODEL_PATH')
+    native_path = Path(MODEL_DIR) / 'diabetes_xgb_model.ubj'
+    if native_path.exists():
+        return str(native_path)
+    return str(Path(MODEL_DIR) / 'diabetes_xgb_model.pkl')
 
-# Method 3: Try importing from the full path
-if not import_success:
-    try:
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("EnhancedDiabetesSystem", 
-                                                    str(Path(PROJECT_ROOT) / 'DiabetesModel' / 'EnhancedDiabetesSystem.py'))
-        EnhancedDiabetesSystem_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(EnhancedDiabetesSystem_module)
-        DiabetesRiskAssessmentSystem = EnhancedDiabetesSystem_module.DiabetesRiskAssessmentSystem
-        print("Successfully imported EnhancedDiabetesSystem (method 3)", file=sys.stderr)
-        import_success = True
-    except Exception as e:
-        print(f"Import method 3 failed: {str(e)}", file=sys.stderr)
+def _load_system(cache_size=0, cache_ttl=None):
+    """Load the risk assessment system, exiting with a JSON error if the model is missing"""
+    model_path = _resolve_model_path()
+    _debug(f"Model path: {model_path}")
 
-if not import_success or DiabetesRiskAssessmentSystem is None:
-    print(f"All import methods failed", file=sys.stderr)
-    print(f"Python path: {sys.path}", file=sys.stderr)
-    print(f"Files in model directory: {list(Path(PROJECT_ROOT, 'DiabetesModel').glob('*.py'))}", file=sys.stderr)
-    print(json.dumps({"error": "Failed to import EnhancedDiabetesSystem module"}))
-    sys.exit(1)
+    # Check if model file exists
+    if not os.path.exists(model_path):
+        error_msg = f"Model file not found at: {model_path}"
+        print(error_msg, file=sys.stderr)
+        print(json.dumps({"error": error_msg}))
+        sys.exit(1)
+
+    # Precomputed risk table built by DiabetesModel/risk_table.py (optional)
+    risk_table_path = os.getenv('ML_RISK_TABLE') or str(Path(model_path).with_name('diabetes_risk_table.npy'))
+    if not os.path.exists(risk_table_path):
+        risk_table_path = None
+
+    # NumPy tree export built by DiabetesModel/tree_evaluator.py (optional)
+    tree_export_path = os.getenv('ML_TREE_EXPORT') or str(Path(model_path).with_name('diabetes_trees.npz'))
+    if not os.path.exists(tree_export_path):
+        tree_export_path = None
+
+    _debug("Loading model...")
+    system = DiabetesRiskAssessmentSystem(model_path=model_path, risk_table_path=risk_table_path,
+                                          cache_size=cache_size, cache_ttl=cache_ttl,
+                                          tree_export_path=tree_export_path)
+    _debug("Model loaded successfully")
+
+    # Per-stage latency histograms (see DiabetesRiskAssessmentSystem.enable_stage_metrics)
+    if os.getenv('ML_STAGE_METRICS', '').lower() == 'true':
+        system.enable_stage_metrics()
+    return system
 
 def main():
     try:
@@ -69,28 +70,26 @@ def main():
         payload = json.loads(raw) if raw else {}
         features = payload.get('features', {})
         
-        print(f"Received features: {features}", file=sys.stderr)
+        _debug(f"Received features: {features}")
 
-        # Load model from DiabetesModel directory
-        model_path = str(Path(PROJECT_ROOT or '.') / 'DiabetesModel' / 'diabetes_xgb_model.pkl')
-        print(f"Model path: {model_path}", file=sys.stderr)
-        
-        # Check if model file exists
-        if not os.path.exists(model_path):
-            error_msg = f"Model file not found at: {model_path}"
-            print(error_msg, file=sys.stderr)
-            print(json.dumps({"error": error_msg}))
-            sys.exit(1)
-        
-        print("Loading model...", file=sys.stderr)
-        system = DiabetesRiskAssessmentSystem(model_path=model_path)
-        print("Model loaded successfully", file=sys.stderr)
+        system = _load_system()
         
-        print("Running prediction...", file=sys.stderr)
-        result = system.predict_risk_with_confidence(features)
-        print("Prediction completed", file=sys.stderr)
+        _debug("Running prediction...")
+        if 'batch' in payload:
+            results = system.predict_risk_batch(
+                payload['batch'], include_importance=payload.get('include_importance', True),
+                fields=payload.get('fields')
+            )
+            _debug("Prediction completed")
+            print(system.to_json(results, depth=2))
+            return
+        result = system.predict_risk_with_confidence(
+            features, include_importance=payload.get('include_importance', True),
+            fields=payload.get('fields')
+        )
+        _debug("Prediction completed")
         
-        print(json.dumps(result))
+        print(system.to_json(result))
     except Exception as e:
         error_msg = f"Assessment failed: {str(e)}"
         print(error_msg, file=sys.stderr)
@@ -99,10 +98,130 @@ def main():
         print(json.dumps({"error": error_msg}))
         sys.exit(1)
 
-if __name__ == '__main__':
-    main()
+def main_packed():
+    """One-shot --packed mode: packed records on stdin, packed results on stdout (see packed_records.py)"""
+    try:
+        records = sys.stdin.buffer.read()
+        system = _load_system()
+        sys.stdout.buffer.write(system.predict_risk_packed(records))
+        sys.stdout.flush()
+    except Exception as e:
+        # Nothing goes to stdout on failure; the exit code tells the caller
+        print(f"Assessment failed: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+# ---------------------------------------------------------------------------
+# Worker mode (--serve)
+#
+# Keeps the model resident and answers newline-delimited JSON on stdin/stdout.
+# Each request line is an object such as
+#   {"id": "42", "type": "predict", "features": {...}, "fields": ["risk_level"]}
+#   {"id": "45", "type": "predict_batch", "batch": [{...}, ...], "fields": [...]}
+#   {"id": "46", "type": "predict_packed", "records": "<base64 packed records>"}
+#   {"id": "43", "type": "ping"}
+#   {"id": "47", "type": "metrics"}   (Prometheus text, with ML_STAGE_METRICS=true)
+#   {"id": "44", "type": "shutdown"}
+# and produces exactly one reply line carrying the same "id". "type" defaults
+# to "predict". Debug output stays on stderr so stdout only ever holds replies.
+# ---------------------------------------------------------------------------
+
+def _reply(message, encode=json.dumps):
+    sys.stdout.write(encode(message) + "\n")
+    sys.stdout.flush()
+
+def _handle_request(system, request, stats):
+    """Dispatch one worker request and return the reply (without the id)"""
+    request_type = request.get('type', 'predict')
+
+    if request_type == 'ping':
+        return {
+            'type': 'pong',
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.monotonic() - stats['started_at'], 3),
+            'requests_served': stats['requests_served'],
+            'cache': system.cache_stats()
+        }
+
+    if request_type == 'predict':
+        result = system.predict_risk_with_confidence(
+            request.get('features', {}), include_importance=request.get('include_importance', True),
+            fields=request.get('fields')
+        )
+        stats['requests_served'] += 1
+        return {'type': 'result', 'result': result}
+
+    if request_type == 'predict_batch':
+        results = system.predict_risk_batch(
+            request.get('batch', []), include_importance=request.get('include_importance', True),
+            fields=request.get('fields')
+        )
+        stats['requests_served'] += 1
+        return {'type': 'batch_result', 'results': results}
+
+    if request_type == 'predict_packed':
+        results = system.predict_risk_packed(base64.b64decode(request.get('records', ''), validate=True))
+        stats['requests_served'] += 1
+        return {'type': 'packed_result', 'results': base64.b64encode(results).decode('ascii')}
 
+    if request_type == 'metrics':
+        if system.stage_metrics is None:
+            return {'type': 'error', 'error': "Stage metrics are disabled; set ML_STAGE_METRICS=true"}
+        return {'type': 'metrics', 'text': system.stage_metrics.to_prometheus()}
 
+    if request_type == 'shutdown':
+        return {'type': 'shutdown', 'status': 'ok'}
 
+    return {'type': 'error', 'error': f"Unknown request type: {request_type}"}
 
+def serve():
+    """Run as a long-lived worker until stdin closes or a shutdown request arrives"""
+    def _terminate(signum, frame):
+        raise SystemExit(0)
 
+    signal.signal(signal.SIGTERM, _terminate)
+
+    # Result memoization only pays off in a long-lived process
+    cache_ttl = os.getenv('ML_RESULT_CACHE_TTL')
+    system = _load_system(cache_size=int(os.getenv('ML_RESULT_CACHE_SIZE', '0')),
+                          cache_ttl=float(cache_ttl) if cache_ttl else None)
+    stats = {'started_at': time.monotonic(), 'requests_served': 0}
+
+    # Replies embed results one level down (batch results two); splice their
+    # pre-encoded sections in
+    def encode(message):
+        return system.to_json(message, depth=3 if message.get('type') == 'batch_result' else 2)
+
+    # Announce readiness so the parent knows the model is loaded
+    _reply({'id': None, 'type': 'ready', 'pid': os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get('id')
+            reply = _handle_request(system, request, stats)
+        except Exception as e:
+            error_msg = f"Assessment failed: {str(e)}"
+            print(error_msg, file=sys.stderr)
+            reply = {'type': 'error', 'error': error_msg}
+
+        _reply({'id': request_id, **reply}, encode)
+        if reply['type'] == 'shutdown':
+            break
+
+    _debug("Worker shutting down")
+
+if __name__ == '__main__':
+    if '--serve' in sys.argv[1:]:
+        serve()
+    elif '--packed' in sys.argv[1:]:
+        main_packed()
+    else:
+        main()
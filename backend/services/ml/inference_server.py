@@ -0,0 +1,412 @@
+"""Local HTTP inference server for the diabetes risk model.
+
+Keeps DiabetesRiskAssessmentSystem resident behind a small asyncio HTTP/1.1
+server (standard library only) so the Node backend can reuse keep-alive
+connections instead of spawning a Python process per assessment.
+
+    POST /predict           {"features": {...}, "include_importance": true, "fields": [...]}
+    POST /predict/batch     {"batch": [{...}, ...], "include_importance": true, "fields": [...]}
+    POST /predict/packed    packed binary records (DiabetesModel/packed_records.py),
+                            answered with packed results
+    POST /predict/ensemble  {"features": {...}}  (predict_risk_with_llm_ensemble payload)
+    POST /predict/what-if   {"features": {...}, "age_offsets": [-10, 10], "toggles": [...]}
+    GET  /healthz
+    GET  /metrics           per-stage latency histograms, Prometheus text (ML_STAGE_METRICS=true)
+
+Request bodies are capped (413), and at most --max-concurrency requests are
+scored at once; anything beyond that is answered 503 with Retry-After
+immediately rather than queued. /healthz and /metrics are answered inline
+and are never rejected for load.
+
+With --micro-batch-wait-ms > 0, concurrent /predict requests are coalesced
+by DiabetesModel/micro_batcher.py into one model call (up to
+--micro-batch-size rows). Batches can only be as large as the number of
+requests admitted at once, so raise --max-concurrency along with it.
+
+With --workers N > 1 (POSIX), the model is loaded once and N forked worker
+processes share it copy-on-write (see prefork_pool.py). Limits, caches,
+micro-batching and /metrics then apply per worker.
+
+Run from backend/:
+
+    python services/ml/inference_server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from diabetes_assess import _debug, _load_system
+from metrics import PROMETHEUS_CONTENT_TYPE
+from micro_batcher import MicroBatcher
+from packed_records import RECORD_DTYPE, RESULTS_CONTENT_TYPE
+from prefork_pool import PreforkPool
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY_BYTES = 1 << 20
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_BATCH_SIZE = 1000
+DEFAULT_KEEPALIVE_SECONDS = 15
+DEFAULT_MICRO_BATCH_SIZE = 64
+
+# Request line and each header line must fit in the stream buffer
+MAX_HEADER_LINE_BYTES = 8192
+MAX_HEADERS = 100
+
+
+class HTTPError(Exception):
+    """Aborts a request with an HTTP error status and a JSON error body"""
+
+    def __init__(self, status, message, close=False, headers=None):
+        super().__init__(message)
+        self.status = HTTPStatus(status)
+        self.message = message
+        self.close = close
+        self.headers = headers or {}
+
+
+class InferenceServer:
+    def __init__(self, system, max_body_bytes=DEFAULT_MAX_BODY_BYTES, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, keepalive_seconds=DEFAULT_KEEPALIVE_SECONDS, batcher=None):
+        self.system = system
+        self.batcher = batcher
+        self.max_body_bytes = max_body_bytes
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.keepalive_seconds = keepalive_seconds
+        # Admission is capped at max_concurrency, so the executor never queues work
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='predict')
+        self.in_flight = 0
+        self.started_at = time.monotonic()
+        self.stats = {'requests_served': 0, 'rejected_busy': 0, 'rejected_too_large': 0, 'errors': 0}
+
+        self.routes = {
+            ('POST', '/predict'): self._predict,
+            ('POST', '/predict/batch'): self._predict_batch,
+            ('POST', '/predict/packed'): self._predict_packed,
+            ('POST', '/predict/ensemble'): self._predict_ensemble,
+            ('POST', '/predict/what-if'): self._predict_what_if,
+            ('GET', '/healthz'): self._healthz,
+            ('GET', '/metrics'): self._metrics,
+        }
+
+    # -- endpoints (scoring ones run in the executor; return (status, JSON text or packed bytes)) --
+
+    def _predict(self, payload):
+        result = self.system.predict_risk_with_confidence(
+            _require(payload, 'features', dict),
+            include_importance=payload.get('include_importance', True),
+            fields=payload.get('fields')
+        )
+        return HTTPStatus.OK, self.system.to_json(result)
+
+    async def _predict_micro_batched(self, payload):
+        """/predict through the micro-batcher; awaits its future instead of holding an executor thread"""
+        future = self.batcher.submit(
+            _require(payload, 'features', dict),
+            include_importance=payload.get('include_importance', True),
+            fields=payload.get('fields')
+        )
+        result = await asyncio.wrap_future(future)
+        return HTTPStatus.OK, self.system.to_json(result)
+
+    def _predict_batch(self, payload):
+        batch = _require(payload, 'batch', list)
+        if len(batch) > self.max_batch_size:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"Batch of {len(batch)} rows exceeds the limit of {self.max_batch_size}")
+        results = self.system.predict_risk_batch(
+            batch, include_importance=payload.get('include_importance', True), fields=payload.get('fields')
+        )
+        return HTTPStatus.OK, self.system.to_json({'results': results}, depth=3)
+
+    def _predict_packed(self, records):
+        if len(records) > self.max_batch_size * RECORD_DTYPE.itemsize:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"Batch of {len(records) // RECORD_DTYPE.itemsize} rows exceeds the limit of "
+                            f"{self.max_batch_size}")
+        return HTTPStatus.OK, self.system.predict_risk_packed(records)
+
+    def _predict_ensemble(self, payload):
+        result = self.system.predict_risk_with_llm_ensemble(_require(payload, 'features', dict))
+        return HTTPStatus.OK, self.system.to_json(result)
+
+    def _predict_what_if(self, payload):
+        options = {key: payload[key] for key in ('age_offsets', 'toggles') if payload.get(key) is not None}
+        for key, value in options.items():
+            if not isinstance(value, list):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{key}' must be a JSON array")
+        result = self.system.predict_what_if(_require(payload, 'features', dict), **options)
+        return HTTPStatus.OK, json.dumps(result)
+
+    def _healthz(self, payload):
+        return HTTPStatus.OK, json.dumps({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.monotonic() - self.started_at, 3),
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            **self.stats,
+            'cache': self.system.cache_stats(),
+            'micro_batcher': self.batcher.stats() if self.batcher is not None else None
+        })
+
+    def _metrics(self, payload):
+        if self.system.stage_metrics is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Stage metrics are disabled; set ML_STAGE_METRICS=true")
+        return HTTPStatus.OK, self.system.stage_metrics.to_prometheus()
+
+    # -- HTTP plumbing -------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            # Line longer than the stream limit
+            await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                             _error_body("Request line or header too long"), keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        """Serve one request; returns whether the connection stays open"""
+        keep_alive = False
+        try:
+            method, path, version = _parse_request_line(request_line)
+            headers = await _read_headers(reader)
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+            handler = self.routes.get((method, path))
+            if handler is None:
+                allowed = [route_method for route_method, route_path in self.routes if route_path == path]
+                if allowed:
+                    raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}",
+                                    close=True, headers={'Allow': ', '.join(allowed)})
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}", close=True)
+
+            if handler == self._healthz:
+                await self._send(writer, HTTPStatus.OK, handler({})[1], keep_alive)
+                return keep_alive
+            if handler == self._metrics:
+                await self._send(writer, HTTPStatus.OK, handler({})[1], keep_alive,
+                                 content_type=PROMETHEUS_CONTENT_TYPE)
+                return keep_alive
+
+            # Reject before reading the body so excess load costs almost nothing
+            if self.in_flight >= self.max_concurrency:
+                self.stats['rejected_busy'] += 1
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Server busy, retry shortly",
+                                close=True, headers={'Retry-After': '1'})
+
+            # Counted from admission, so requests still sending their bodies
+            # hold a slot too and max_concurrency is a real bound
+            self.in_flight += 1
+            try:
+                payload = await self._read_body(method, headers, reader, packed=handler == self._predict_packed)
+                if handler == self._predict and self.batcher is not None:
+                    status, body = await self._predict_micro_batched(payload)
+                else:
+                    loop = asyncio.get_running_loop()
+                    status, body = await loop.run_in_executor(self.executor, handler, payload)
+            except ValueError as e:
+                # e.g. an unknown name in fields
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+            finally:
+                self.in_flight -= 1
+            self.stats['requests_served'] += 1
+        except HTTPError as e:
+            status, body = e.status, _error_body(e.message)
+            keep_alive = keep_alive and not e.close
+            extra_headers = e.headers
+        except Exception as e:
+            print(f"Request failed: {str(e)}", file=sys.stderr)
+            self.stats['errors'] += 1
+            status, body, extra_headers = HTTPStatus.INTERNAL_SERVER_ERROR, _error_body(f"Assessment failed: {str(e)}"), {}
+        else:
+            extra_headers = {}
+
+        await self._send(writer, status, body, keep_alive, extra_headers)
+        return keep_alive
+
+    async def _read_body(self, method, headers, reader, packed=False):
+        """The JSON request object, or the raw bytes for packed routes"""
+        if method != 'POST':
+            return {}
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported; send Content-Length",
+                            close=True)
+        try:
+            length = int(headers['content-length'])
+        except (KeyError, ValueError):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Content-Length header is required", close=True)
+        if length > self.max_body_bytes:
+            self.stats['rejected_too_large'] += 1
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"Body of {length} bytes exceeds the limit of {self.max_body_bytes}", close=True)
+
+        raw = await reader.readexactly(length)
+        if packed:
+            return raw
+        try:
+            payload = json.loads(raw) if raw else {}
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {str(e)}")
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return payload
+
+    async def _send(self, writer, status, body, keep_alive, extra_headers=None, content_type=None):
+        packed = isinstance(body, bytes)
+        data = body if packed else body.encode('utf-8')
+        if content_type is None:
+            content_type = RESULTS_CONTENT_TYPE if packed else 'application/json'
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if keep_alive:
+            head.append(f"Keep-Alive: timeout={self.keepalive_seconds}")
+        head.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _require(payload, key, expected_type):
+    value = payload.get(key)
+    if not isinstance(value, expected_type):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{key}' must be a JSON {'object' if expected_type is dict else 'array'}")
+    return value
+
+
+def _error_body(message):
+    return json.dumps({'error': message})
+
+
+def _parse_request_line(line):
+    try:
+        method, target, version = line.decode('latin-1').rstrip('\r\n').split(' ')
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line", close=True)
+    if version not in ('HTTP/1.0', 'HTTP/1.1'):
+        raise HTTPError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED, f"Unsupported protocol {version}", close=True)
+    return method.upper(), target.split('?', 1)[0], version
+
+
+async def _read_headers(reader):
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        try:
+            line = await reader.readline()
+        except ValueError:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long", close=True)
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, sep, value = line.decode('latin-1').partition(':')
+        if not sep:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed header line", close=True)
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, f"More than {MAX_HEADERS} headers", close=True)
+
+
+async def run_server(server, host=None, port=None, sock=None):
+    """Serve until SIGTERM/SIGINT, on host:port or an already-listening socket"""
+    if sock is not None:
+        listener = await asyncio.start_server(server.handle_connection, sock=sock, limit=MAX_HEADER_LINE_BYTES)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_HEADER_LINE_BYTES)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    addresses = ', '.join(str(sock.getsockname()) for sock in listener.sockets)
+    print(f"Inference server listening on {addresses} (pid {os.getpid()})", file=sys.stderr)
+    async with listener:
+        await stop.wait()
+    if server.batcher is not None:
+        server.batcher.close()
+    server.executor.shutdown(wait=True)
+    _debug("Inference server stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP inference server for the diabetes risk model")
+    parser.add_argument('--host', default=os.getenv('ML_SERVER_HOST', DEFAULT_HOST))
+    parser.add_argument('--port', type=int, default=int(os.getenv('ML_SERVER_PORT', DEFAULT_PORT)))
+    parser.add_argument('--max-body-bytes', type=int,
+                        default=int(os.getenv('ML_SERVER_MAX_BODY_BYTES', DEFAULT_MAX_BODY_BYTES)))
+    parser.add_argument('--max-concurrency', type=int,
+                        default=int(os.getenv('ML_SERVER_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)),
+                        help="Requests scored at once; more are rejected with 503")
+    parser.add_argument('--max-batch-size', type=int,
+                        default=int(os.getenv('ML_SERVER_MAX_BATCH_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+                        help="Rows accepted by /predict/batch")
+    parser.add_argument('--micro-batch-wait-ms', type=float, default=float(os.getenv('ML_MICRO_BATCH_WAIT_MS', '0')),
+                        help="Coalesce concurrent /predict requests for up to this long (0 = off)")
+    parser.add_argument('--micro-batch-size', type=int,
+                        default=int(os.getenv('ML_MICRO_BATCH_SIZE', DEFAULT_MICRO_BATCH_SIZE)),
+                        help="Most /predict requests scored in one model call")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('ML_SERVER_WORKERS', '1')),
+                        help="Forked worker processes sharing one loaded model (POSIX only)")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1:
+        # The pool supplies the parallelism; keep each worker's booster on one
+        # core (must be set before xgboost's OpenMP runtime loads)
+        os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+    cache_ttl = os.getenv('ML_RESULT_CACHE_TTL')
+    system = _load_system(cache_size=int(os.getenv('ML_RESULT_CACHE_SIZE', '0')),
+                          cache_ttl=float(cache_ttl) if cache_ttl else None)
+
+    def make_server():
+        # Threads do not survive fork, so the executor and batcher are created per process
+        batcher = None
+        if args.micro_batch_wait_ms > 0:
+            batcher = MicroBatcher(system, args.micro_batch_wait_ms, args.micro_batch_size)
+        return InferenceServer(system, args.max_body_bytes, args.max_concurrency, args.max_batch_size,
+                               batcher=batcher)
+
+    if args.workers <= 1:
+        asyncio.run(run_server(make_server(), args.host, args.port))
+        return
+
+    # Load the booster in the parent (with a tree export it is otherwise
+    # loaded lazily by each worker) so every worker shares the same pages
+    system.model
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    pool = PreforkPool(args.workers, lambda slot: asyncio.run(run_server(make_server(), sock=sock)))
+    sys.exit(pool.run())
+
+
+if __name__ == '__main__':
+    main()
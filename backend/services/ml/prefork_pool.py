@@ -0,0 +1,99 @@
+"""Pre-fork worker pool for the inference server (POSIX only).
+
+The parent loads the model once, then forks N workers that inherit it, and
+its memory pages stay shared copy-on-write between them. gc.freeze() moves
+everything allocated so far out of the garbage collector's reach so
+collections in the workers do not touch (and so copy) those pages. Workers
+accept from one inherited listening socket, so the kernel spreads
+connections across them, and the parent restarts any worker that exits
+until it is told to stop itself.
+"""
+
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+RESTART_BACKOFF_SECONDS = 1.0
+
+
+class PreforkPool:
+    def __init__(self, n_workers, run_worker):
+        """
+        Args:
+            n_workers: Number of worker processes to keep running
+            run_worker: Called in each forked worker with its slot number
+                (0..n_workers-1); the worker exits when it returns
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Pre-fork workers need os.fork (not available on this platform)")
+        if n_workers < 1:
+            raise ValueError("n_workers must be at least 1")
+        self.n_workers = n_workers
+        self.run_worker = run_worker
+        self.workers = {}
+        self.restarts = 0
+        self._stopping = False
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM/SIGINT; returns the exit code"""
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+        print(f"Pre-fork pool: parent {os.getpid()}, workers {sorted(self.workers)}", file=sys.stderr)
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            slot, started_at = self.workers.pop(pid, (None, None))
+            if slot is None:
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            if self._stopping:
+                continue
+            print(f"Worker {pid} (slot {slot}) exited with {exit_code}; restarting", file=sys.stderr)
+            if time.monotonic() - started_at < MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(RESTART_BACKOFF_SECONDS)
+            if not self._stopping:
+                self.restarts += 1
+                self._spawn(slot)
+
+        return 0
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (slot, time.monotonic())
+            return
+
+        # Worker: default signal handling, then serve until told to stop
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            self.run_worker(slot)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
@@ -1,29 +1,335 @@
 import { spawn } from 'child_process';
 import path from 'path';
+import readline from 'readline';
 import { fileURLToPath } from 'url';
 
-// Runs the Python risk assessment script with provided feature payload
-export function assessDiabetesRiskPython(features) {
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+const PROJECT_ROOT = path.resolve(__dirname, '..');
+const SCRIPT_PATH = path.resolve(__dirname, 'ml', 'diabetes_assess.py');
+const WORKER_TIMEOUT_MS = parseInt(process.env.ML_WORKER_TIMEOUT_MS || '30000');
+
+// Packed batch format; must match DiabetesModel/packed_records.py.
+// Input record (8 bytes): symptom bitmask uint16 (bit i = SYMPTOM_NAMES[i],
+// bit 14 = Gender), answered bitmask uint16 (bit 15 = Age), age float32.
+// Result record (10 bytes): probability float32, confidence float32,
+// risk code uint8, flags uint8 (1 = incomplete input). All little-endian.
+const SYMPTOM_NAMES = [
+  'Polyuria', 'Polydipsia', 'sudden weight loss', 'weakness', 'Polyphagia',
+  'Genital thrush', 'visual blurring', 'Itching', 'Irritability', 'delayed healing',
+  'partial paresis', 'muscle stiffness', 'Alopecia', 'Obesity',
+];
+const GENDER_BIT = 14;
+const AGE_BIT = 15;
+const RECORD_BYTES = 8;
+const RESULT_BYTES = 10;
+const RISK_LEVELS = ['low', 'moderate', 'high', 'critical'];
+const TRUE_STRINGS = new Set(['yes', 'true', '1']);
+const BATCH_FIELDS = ['risk_level', 'diabetes_probability', 'confidence', 'input_issues'];
+
+function resolvePythonCommand(extraArgs = []) {
+  const pythonCmd = process.env.PYTHON_BIN || (process.platform === 'win32' ? 'python' : 'python3');
+  const args = pythonCmd === 'py' ? ['-3', SCRIPT_PATH, ...extraArgs] : [SCRIPT_PATH, ...extraArgs];
+  return { pythonCmd, args };
+}
+
+/**
+ * Long-lived `diabetes_assess.py --serve` process.
+ * The model is loaded once; requests and replies are newline-delimited JSON
+ * matched by id, so several assessments can be in flight at the same time.
+ */
+class PythonAssessmentWorker {
+  constructor() {
+    this.child = null;
+    this.ready = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  _start() {
+    const { pythonCmd, args } = resolvePythonCommand(['--serve']);
+    const child = spawn(pythonCmd, args, {
+      cwd: path.resolve(process.cwd()),
+      env: {
+        ...process.env,
+        PROJECT_ROOT,
+      }
+    });
+    this.child = child;
+
+    this.ready = new Promise((resolve, reject) => {
+      const lines = readline.createInterface({ input: child.stdout });
+      lines.on('line', (line) => {
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (e) {
+          console.error('Failed to parse Python worker output:', line);
+          return;
+        }
+        if (message.type === 'ready') {
+          console.log('Python assessment worker ready, pid:', message.pid);
+          resolve();
+          return;
+        }
+        const entry = this.pending.get(message.id);
+        if (!entry) return;
+        this.pending.delete(message.id);
+        clearTimeout(entry.timer);
+        if (message.type === 'error') {
+          entry.reject(new Error(message.error));
+        } else {
+          entry.resolve(message);
+        }
+      });
+
+      child.on('error', (err) => reject(err));
+
+      child.on('close', (code) => {
+        console.warn('Python assessment worker exited with code:', code);
+        reject(new Error(`Python worker exited with code ${code}`));
+        for (const entry of this.pending.values()) {
+          clearTimeout(entry.timer);
+          entry.reject(new Error(`Python worker exited with code ${code}`));
+        }
+        this.pending.clear();
+        if (this.child === child) {
+          this.child = null;
+          this.ready = null;
+        }
+      });
+    });
+
+    child.stderr.on('data', (data) => {
+      console.log('Python worker stderr:', data.toString().trim());
+    });
+
+    return this.ready;
+  }
+
+  async request(message) {
+    if (!this.child) this._start();
+    await this.ready;
+
+    const id = String(this.nextId++);
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Python worker timed out after ${WORKER_TIMEOUT_MS} ms`));
+      }, WORKER_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+      this.child.stdin.write(JSON.stringify({ id, ...message }) + '\n');
+    });
+  }
+
+  async ping() {
+    return this.request({ type: 'ping' });
+  }
+
+  async shutdown() {
+    if (!this.child) return;
+    try {
+      await this.request({ type: 'shutdown' });
+    } finally {
+      if (this.child) this.child.stdin.end();
+    }
+  }
+}
+
+export const pythonAssessmentWorker = new PythonAssessmentWorker();
+
+// POSTs to a running services/ml/inference_server.py; fetch keeps the
+// connection alive between calls.
+export async function requestInferenceServer(route, payload) {
+  const baseUrl = process.env.ML_INFERENCE_URL.replace(/\/$/, '');
+  const response = await fetch(`${baseUrl}${route}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(payload),
+    signal: AbortSignal.timeout(WORKER_TIMEOUT_MS),
+  });
+  const body = await response.json();
+  if (!response.ok) {
+    throw new Error(`Inference server returned ${response.status}: ${body.error}`);
+  }
+  return body;
+}
+
+// Numeric value of one answer, or null when it was not given
+function answerValue(value) {
+  if (value === undefined || value === null) return null;
+  if (typeof value === 'string') return TRUE_STRINGS.has(value.trim().toLowerCase()) ? 1 : 0;
+  return Number(value);
+}
+
+export function packFeatureRecords(featureRows) {
+  const buffer = Buffer.alloc(featureRows.length * RECORD_BYTES);
+  featureRows.forEach((features, i) => {
+    let symptoms = 0;
+    let answered = 0;
+    const bits = [...SYMPTOM_NAMES.map((name, bit) => [name, bit]), ['Gender', GENDER_BIT]];
+    for (const [name, bit] of bits) {
+      const value = answerValue(features[name]);
+      if (value === null) continue;
+      answered |= 1 << bit;
+      if (value > 0) symptoms |= 1 << bit;
+    }
+    const age = answerValue(features.Age);
+    if (age !== null) answered |= 1 << AGE_BIT;
+
+    const offset = i * RECORD_BYTES;
+    buffer.writeUInt16LE(symptoms, offset);
+    buffer.writeUInt16LE(answered, offset + 2);
+    buffer.writeFloatLE(age ?? 0, offset + 4);
+  });
+  return buffer;
+}
+
+export function unpackResults(buffer) {
+  const results = [];
+  for (let offset = 0; offset + RESULT_BYTES <= buffer.length; offset += RESULT_BYTES) {
+    results.push({
+      risk_level: RISK_LEVELS[buffer.readUInt8(offset + 8)],
+      diabetes_probability: buffer.readFloatLE(offset),
+      confidence: buffer.readFloatLE(offset + 4),
+      incomplete: (buffer.readUInt8(offset + 9) & 1) !== 0,
+    });
+  }
+  return results;
+}
+
+// Same shape as unpackResults for a JSON batch result
+function summarizeResult(result) {
+  const summary = {
+    risk_level: result.risk_level,
+    diabetes_probability: result.diabetes_probability,
+    confidence: result.confidence,
+    // Unknown extra fields are reported too, but do not make the input incomplete
+    incomplete: Boolean(result.input_issues?.missing_fields?.length || result.input_issues?.unrecognized_values?.length),
+  };
+  if (result.error) summary.error = result.error;
+  return summary;
+}
+
+// Runs diabetes_assess.py once with the given stdin and resolves to its stdout
+function runPythonOnce(extraArgs, input) {
+  return new Promise((resolve, reject) => {
+    const { pythonCmd, args } = resolvePythonCommand(extraArgs);
+    const child = spawn(pythonCmd, args, {
+      cwd: path.resolve(process.cwd()),
+      env: {
+        ...process.env,
+        PROJECT_ROOT,
+      }
+    });
+
+    const chunks = [];
+    let stderr = '';
+    child.stdout.on('data', (data) => chunks.push(data));
+    child.stderr.on('data', (data) => {
+      stderr += data.toString();
+    });
+    child.on('error', (err) => reject(err));
+    child.on('close', (code) => {
+      if (code !== 0) {
+        return reject(new Error(`Python exited with code ${code}: ${stderr}`));
+      }
+      resolve(Buffer.concat(chunks));
+    });
+
+    child.stdin.end(input);
+  });
+}
+
+async function assessBatchPacked(featureRows) {
+  const records = packFeatureRecords(featureRows);
+  if (process.env.ML_INFERENCE_URL) {
+    const baseUrl = process.env.ML_INFERENCE_URL.replace(/\/$/, '');
+    const response = await fetch(`${baseUrl}/predict/packed`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/x-diabetes-records' },
+      body: records,
+      signal: AbortSignal.timeout(WORKER_TIMEOUT_MS),
+    });
+    if (!response.ok) {
+      const body = await response.json();
+      throw new Error(`Inference server returned ${response.status}: ${body.error}`);
+    }
+    return unpackResults(Buffer.from(await response.arrayBuffer()));
+  }
+  if (process.env.ML_PERSISTENT_WORKER === 'true') {
+    const reply = await pythonAssessmentWorker.request({
+      type: 'predict_packed',
+      records: records.toString('base64'),
+    });
+    return unpackResults(Buffer.from(reply.results, 'base64'));
+  }
+  return unpackResults(await runPythonOnce(['--packed'], records));
+}
+
+async function assessBatchJson(featureRows) {
+  const payload = { batch: featureRows, fields: BATCH_FIELDS };
+  let results;
+  if (process.env.ML_INFERENCE_URL) {
+    results = (await requestInferenceServer('/predict/batch', payload)).results;
+  } else if (process.env.ML_PERSISTENT_WORKER === 'true') {
+    results = (await pythonAssessmentWorker.request({ type: 'predict_batch', ...payload })).results;
+  } else {
+    results = JSON.parse((await runPythonOnce([], JSON.stringify(payload))).toString());
+  }
+  return results.map(summarizeResult);
+}
+
+// Scores many patients in one call and resolves to one
+// { risk_level, diabetes_probability, confidence, incomplete } per row, in
+// order. With ML_PACKED_TRANSPORT=true rows travel as packed binary records
+// (probabilities are then unrounded); otherwise as JSON. Transport selection
+// (ML_INFERENCE_URL, ML_PERSISTENT_WORKER, spawn) is as for single assessments.
+export function assessDiabetesRiskBatchPython(featureRows) {
+  if (featureRows.length === 0) return Promise.resolve([]);
+  if (process.env.ML_PACKED_TRANSPORT === 'true') {
+    return assessBatchPacked(featureRows);
+  }
+  return assessBatchJson(featureRows);
+}
+
+// Runs the Python risk assessment script with provided feature payload.
+// Set ML_INFERENCE_URL to score through the HTTP inference server, or
+// ML_PERSISTENT_WORKER=true to reuse a resident worker process, instead of
+// spawning (and reloading the model) for every assessment.
+// options.fields limits the result to the listed sections (e.g. ['risk_level',
+// 'diabetes_probability'] for list views); omit it for the full result.
+// The full result includes feature_importance (SHAP), which the assessment
+// controller needs. A spawned one-shot process then has to import xgboost
+// (~2 s per assessment), so a resident transport pays off. Only fields without
+// feature_importance/recommendations, or include_importance: false, keep a
+// spawn on the slim import path.
+export function assessDiabetesRiskPython(features, options = {}) {
+  const { fields } = options;
+  if (process.env.ML_INFERENCE_URL) {
+    return requestInferenceServer('/predict', { features, fields });
+  }
+  if (process.env.ML_PERSISTENT_WORKER === 'true') {
+    return pythonAssessmentWorker
+      .request({ type: 'predict', features, fields })
+      .then((reply) => reply.result);
+  }
+
   return new Promise((resolve, reject) => {
-    const __filename = fileURLToPath(import.meta.url);
-    const __dirname = path.dirname(__filename);
     // Resolve from the service file location instead of cwd so deployment layout differences
     // do not break model execution.
-    const projectRoot = path.resolve(__dirname, '..');
-    const scriptPath = path.resolve(__dirname, 'ml', 'diabetes_assess.py');
-
-    console.log('Project root:', projectRoot);
-    console.log('Script path:', scriptPath);
+    console.log('Project root:', PROJECT_ROOT);
+    console.log('Script path:', SCRIPT_PATH);
     console.log('Current working directory:', process.cwd());
 
-    const pythonCmd = process.env.PYTHON_BIN || (process.platform === 'win32' ? 'python' : 'python3');
-    const spawnArgs = (cmd) => (cmd === 'py' ? ['-3', scriptPath] : [scriptPath]);
+    const { pythonCmd, args } = resolvePythonCommand();
 
-    const child = spawn(pythonCmd, spawnArgs(pythonCmd), {
+    const child = spawn(pythonCmd, args, {
       cwd: path.resolve(process.cwd()),
       env: {
         ...process.env,
-        PROJECT_ROOT: projectRoot,
+        PROJECT_ROOT,
       }
     });
 
@@ -68,7 +374,7 @@ export function assessDiabetesRiskPython(features) {
     });
 
     // Write JSON payload to stdin
-    child.stdin.write(JSON.stringify({ features }));
+    child.stdin.write(JSON.stringify({ features, fields }));
     child.stdin.end();
   });
 }